@@ -0,0 +1,99 @@
+""" Compares ways of filtering a set of movies on a numeric attribute, as get_movies_in_ranges does with a second range.
+
+Run from the repository root:
+
+    python -m benchmarks.column_store [--sizes 1000 100000 1000000]
+
+ColumnStore.select tests the ranks one at a time in a comprehension. Without NumPy, the standard library has no
+vectorised comparison, and building masks with map and compress is slower than the comprehension, as every value
+read from the array is still boxed into a Python number for its comparison. This benchmark keeps that choice checked.
+"""
+import argparse
+import random
+import time
+
+from itertools import compress, repeat
+from operator import ge, le
+
+from movie_web_app.adapters.column_store import ColumnStore
+from movie_web_app.domain.model import Movie
+
+
+def make_movies(number_of_movies: int, seed: int = 0):
+    """ Returns synthetic movies with a runtime and a rating, and a revenue for four in five of them. """
+    generator = random.Random(seed)
+    movies = list()
+    for rank in range(1, number_of_movies + 1):
+        movie = Movie('Movie {}'.format(rank), 2016)
+        movie.rank = rank
+        movie.runtime_minutes = generator.randint(60, 200)
+        movie.rating = round(generator.uniform(1, 10), 1)
+        movie.revenue = generator.uniform(0, 900) if generator.random() < 0.8 else None
+        movies.append(movie)
+    return movies
+
+
+def build_columns(movies):
+    columns = ColumnStore()
+    for movie in movies:
+        columns.set(movie.rank, {'runtime': movie.runtime_minutes, 'rating': movie.rating, 'revenue': movie.revenue})
+    return columns
+
+
+def best_time(function, repeat_count: int):
+    best = float('inf')
+    for _ in range(repeat_count):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(number_of_movies: int, repeat_count: int):
+    movies = make_movies(number_of_movies)
+    movies_by_rank = {movie.rank: movie for movie in movies}
+    columns = build_columns(movies)
+    # Every other movie, standing in for the movies in the narrowest range, filtered on a rating and a revenue range.
+    ranks = list(range(1, number_of_movies + 1, 2))
+    column_arrays = columns._ColumnStore__columns
+    present_masks = columns._ColumnStore__present
+
+    def select_from_movies(attribute, minimum, maximum):
+        selected = list()
+        for rank in ranks:
+            value = getattr(movies_by_rank[rank], attribute)
+            if value is not None and minimum <= value <= maximum:
+                selected.append(rank)
+        return selected
+
+    def select_with_masks(attribute, minimum, maximum):
+        column = column_arrays[attribute]
+        selected = list(compress(ranks, map(present_masks[attribute].__getitem__, ranks)))
+        selected = list(compress(selected, map(le, repeat(minimum), map(column.__getitem__, selected))))
+        return list(compress(selected, map(ge, repeat(maximum), map(column.__getitem__, selected))))
+
+    print('{:,} movies, selecting from {:,}'.format(number_of_movies, len(ranks)))
+    print('  {:<16}{:>18}{:>18}{:>18}'.format('', 'Movie attributes', 'column, per rank', 'column, masks'))
+    for attribute, minimum, maximum in [('rating', 7.0, 8.5), ('revenue', 100.0, 900.0)]:
+        expected = select_from_movies(attribute, minimum, maximum)
+        assert columns.select(ranks, attribute, minimum, maximum) == expected
+        assert select_with_masks(attribute, minimum, maximum) == expected
+
+        print('  {:<16}{:>15.2f} ms{:>15.2f} ms{:>15.2f} ms'.format(
+            attribute,
+            best_time(lambda: select_from_movies(attribute, minimum, maximum), repeat_count) * 1000,
+            best_time(lambda: columns.select(ranks, attribute, minimum, maximum), repeat_count) * 1000,
+            best_time(lambda: select_with_masks(attribute, minimum, maximum), repeat_count) * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args(argv)
+    for number_of_movies in arguments.sizes:
+        run(number_of_movies, arguments.repeat)
+
+
+if __name__ == '__main__':
+    main()
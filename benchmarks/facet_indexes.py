@@ -0,0 +1,122 @@
+""" Compares the memory and speed of facet indexes kept as sorted rank lists and as bitsets.
+
+Run from the repository root:
+
+    python -m benchmarks.facet_indexes [--sizes 1000 100000 1000000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from movie_web_app.adapters.bitset_index import BitsetIndex, count
+from movie_web_app.adapters.search_index import intersect
+
+YEARS = list(range(2006, 2017))
+GENRES = ['Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Sport', 'Thriller', 'War',
+          'Western']
+
+
+def make_movies(number_of_movies: int, seed: int = 0):
+    """ Returns a synthetic (rank, year, genres) for each movie, with one to three genres per movie. """
+    generator = random.Random(seed)
+    return [(rank, generator.choice(YEARS), generator.sample(GENRES, generator.randint(1, 3)))
+            for rank in range(1, number_of_movies + 1)]
+
+
+def build_lists(movies):
+    years = dict()
+    genres = dict()
+    for rank, year, movie_genres in movies:
+        years.setdefault(year, list()).append(rank)
+        for genre in movie_genres:
+            genres.setdefault(genre, list()).append(rank)
+    return years, genres
+
+
+def build_bitsets(movies):
+    years = BitsetIndex()
+    genres = BitsetIndex()
+    for rank, year, movie_genres in movies:
+        years.add(year, rank)
+        for genre in movie_genres:
+            genres.add(genre, rank)
+    # Queries use the int form of each bitset, which BitsetIndex keeps alongside its bytearray.
+    for index in (years, genres):
+        for value in index.values():
+            index.get(value)
+    return years, genres
+
+
+def traced(build, movies):
+    """ Returns what build(movies) returns, and the number of bytes it allocated and still holds.
+
+    This counts every object of the indexes (dicts, lists, bytearrays, ints and their allocator overhead), but not
+    the ranks, which already exist in movies as they do in the Movie objects the repository indexes.
+    """
+    tracemalloc.start()
+    try:
+        result = build(movies)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def best_time(function, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(number_of_movies: int, repeat: int):
+    movies = make_movies(number_of_movies)
+    (year_lists, genre_lists), list_bytes = traced(build_lists, movies)
+    (year_bitsets, genre_bitsets), bitset_bytes = traced(build_bitsets, movies)
+
+    # A year, and two genres of a movie of that year: the filter /movies_by_filter runs on every faceted page.
+    year, first_genre, second_genre = 2016, 'Drama', 'Comedy'
+
+    def intersect_lists():
+        postings = sorted([year_lists[year], genre_lists[first_genre], genre_lists[second_genre]], key=len)
+        return len(intersect(intersect(postings[0], postings[1]), postings[2]))
+
+    def intersect_bitsets():
+        return count(year_bitsets.get(year) & genre_bitsets.get(first_genre) & genre_bitsets.get(second_genre))
+
+    def genre_counts_lists():
+        matches = set(year_lists[year])
+        return {genre: sum(1 for rank in ranks if rank in matches) for genre, ranks in genre_lists.items()}
+
+    def genre_counts_bitsets():
+        matches = year_bitsets.get(year)
+        return {genre: count(genre_bitsets.get(genre) & matches) for genre in genre_bitsets.values()}
+
+    assert intersect_lists() == intersect_bitsets()
+    assert genre_counts_lists() == genre_counts_bitsets()
+
+    print('{:,} movies'.format(number_of_movies))
+    print('  {:<24}{:>14}{:>14}'.format('', 'rank lists', 'bitsets'))
+    print('  {:<24}{:>11,.0f} KB{:>11,.0f} KB'.format('memory', list_bytes / 1024, bitset_bytes / 1024))
+    print('  {:<24}{:>11.3f} ms{:>11.3f} ms'.format(
+        'year AND 2 genres', best_time(intersect_lists, repeat) * 1000, best_time(intersect_bitsets, repeat) * 1000))
+    print('  {:<24}{:>11.3f} ms{:>11.3f} ms'.format(
+        'genre counts in year', best_time(genre_counts_lists, repeat) * 1000,
+        best_time(genre_counts_bitsets, repeat) * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args(argv)
+    for number_of_movies in arguments.sizes:
+        run(number_of_movies, arguments.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+""" Compares looking up users and reviews in MemoryRepository by scanning lists and through its hash indexes.
+
+Run from the repository root:
+
+    python -m benchmarks.user_review_indexes [--users 100000] [--reviews 1000000]
+"""
+import argparse
+import time
+
+from movie_web_app.adapters.memory_repository import MemoryRepository
+from movie_web_app.domain.model import Movie, User, make_review
+
+
+def build_repository(number_of_users: int, number_of_reviews: int, number_of_movies: int):
+    repo = MemoryRepository()
+    users = [User('user{}'.format(index), 'password') for index in range(number_of_users)]
+    for user in users:
+        repo.add_user(user)
+
+    movies = list()
+    for rank in range(1, number_of_movies + 1):
+        movie = Movie('Movie {}'.format(rank), 2016)
+        movie.rank = rank
+        movies.append(movie)
+
+    for index in range(number_of_reviews):
+        # Spread the reviews evenly, but not in step, over users and movies.
+        user = users[index % number_of_users]
+        movie = movies[index * 7 % number_of_movies]
+        repo.add_review(make_review('Review {}'.format(index), user, movie, index % 10 + 1))
+    return repo
+
+
+def time_per_call(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+def run(number_of_users: int, number_of_reviews: int, number_of_movies: int, lookups: int):
+    start = time.perf_counter()
+    repo = build_repository(number_of_users, number_of_reviews, number_of_movies)
+    print('{:,} users, {:,} reviews of {:,} movies, built in {:.1f} s'.format(
+        number_of_users, number_of_reviews, number_of_movies, time.perf_counter() - start))
+
+    users = repo.get_all_users()
+    reviews = repo.get_review()
+    # Look up the latest users and reviews, which a scan reaches last, as happens for newly registered users.
+    usernames = [user.user_name for user in users[-lookups:]]
+    latest_reviews = reviews[-lookups:]
+    movie_ranks = [review.movie.rank for review in latest_reviews]
+
+    # The lookups as MemoryRepository did them before it kept indexes.
+    def scan_for_user(username):
+        return next((user for user in users if user.user_name == username), None)
+
+    def scan_for_review(review):
+        return review in reviews
+
+    def scan_for_reviews_of_movie(movie_rank):
+        return [review for review in reviews if review.movie.rank == movie_rank]
+
+    comparisons = [
+        ('get_user', scan_for_user, repo.get_user, usernames),
+        ('have_review', scan_for_review, repo.have_review, latest_reviews),
+        ('reviews of a movie', scan_for_reviews_of_movie, repo.get_reviews_for_movie, movie_ranks),
+    ]
+    print('  {:<20}{:>14}{:>14}'.format('', 'list scan', 'index'))
+    for name, scan, lookup, arguments in comparisons:
+        print('  {:<20}{:>11.3f} ms{:>11.2f} us'.format(
+            name, time_per_call(scan, arguments) * 1000, time_per_call(lookup, arguments * 1000) * 10 ** 6))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=1000000)
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=5)
+    arguments = parser.parse_args(argv)
+    run(arguments.users, arguments.reviews, arguments.movies, arguments.lookups)
+
+
+if __name__ == '__main__':
+    main()
@@ -20,4 +20,14 @@ class Config:
     SQLALCHEMY_ECHO = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    REPOSITORY = environ.get('REPOSITORY')
\ No newline at end of file
+    REPOSITORY = environ.get('REPOSITORY')
+
+    # Poster configuration
+    OMDB_API_KEY = environ.get('OMDB_API_KEY')
+    POSTER_CACHE_PATH = environ.get('POSTER_CACHE_PATH')
+    POSTER_DEADLINE = environ.get('POSTER_DEADLINE')
+    POSTER_IMAGE_PATH = environ.get('POSTER_IMAGE_PATH')
+    POSTER_IMAGE_MAX_BYTES = environ.get('POSTER_IMAGE_MAX_BYTES')
+
+    # Page cache configuration
+    PAGE_CACHE_MAX_BYTES = environ.get('PAGE_CACHE_MAX_BYTES')
@@ -1,5 +1,6 @@
 """Initialize Flask app."""
 
+import atexit
 import os
 
 from flask import Flask
@@ -9,8 +10,10 @@ from sqlalchemy.orm import sessionmaker, clear_mappers
 from sqlalchemy.pool import NullPool
 
 import movie_web_app.adapters.repository as repo
-from movie_web_app.adapters import memory_repository, database_repository
-from movie_web_app.adapters.orm import metadata, map_model_to_tables
+from movie_web_app.adapters import memory_repository, database_repository, omdb, poster_cache, image_store
+from movie_web_app.adapters.orm import metadata, map_model_to_tables, upgrade_schema
+from movie_web_app.utilities import page_cache
+from movie_web_app.utilities.lru_cache import LRUCache
 
 
 def create_app(test_config=None):
@@ -62,6 +65,9 @@ def create_app(test_config=None):
             database_repository.populate(database_engine, data_path)
 
         else:
+            # A database created by an earlier version of the application may lack tables, columns or triggers.
+            upgrade_schema(database_engine)
+
             # Solely generate mappings that map domain model classes to the database tables.
             map_model_to_tables()
 
@@ -70,6 +76,30 @@ def create_app(test_config=None):
         # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
         repo.repo_instance = database_repository.SqlAlchemyRepository(session_factory)
 
+    # Poster lookups go through a cache, so that OMDb is asked about each title once rather than on every page view.
+    # With a POSTER_CACHE_PATH configured, resolved posters also survive application restarts. A cache left by an
+    # earlier app is closed, so that its fetch threads and store don't outlive it; the last one is closed at exit.
+    poster_cache.close_instance()
+    atexit.unregister(poster_cache.close_instance)
+    atexit.register(poster_cache.close_instance)
+    poster_store = None
+    if app.config['POSTER_CACHE_PATH']:
+        poster_store = poster_cache.PosterStore(app.config['POSTER_CACHE_PATH'])
+    omdb.client_instance = omdb.OmdbClient(app.config['OMDB_API_KEY'])
+    poster_deadline = float(app.config['POSTER_DEADLINE'] or poster_cache.DEFAULT_DEADLINE)
+    poster_cache.cache_instance = poster_cache.PosterCache(omdb.client_instance.get_poster, poster_store,
+                                                           deadline=poster_deadline)
+
+    # Poster images themselves are downloaded once and served from a local disk cache, if one is configured.
+    image_store.store_instance = None
+    if app.config['POSTER_IMAGE_PATH']:
+        image_max_bytes = app.config.get('POSTER_IMAGE_MAX_BYTES')
+        image_max_bytes = int(image_max_bytes) if image_max_bytes else image_store.DEFAULT_MAX_BYTES
+        image_store.store_instance = image_store.ImageStore(app.config['POSTER_IMAGE_PATH'], image_max_bytes)
+
+    # Whole pages for anonymous visitors are cached too, up to PAGE_CACHE_MAX_BYTES of rendered HTML.
+    page_cache_max_bytes = int(app.config['PAGE_CACHE_MAX_BYTES'] or page_cache.DEFAULT_MAX_BYTES)
+    page_cache.cache_instance = page_cache.PageCache(max_bytes=page_cache_max_bytes)
 
     # Build the application - these steps require an application context.
     with app.app_context():
@@ -80,12 +110,18 @@ def create_app(test_config=None):
 
         from .movies import movies
         app.register_blueprint(movies.movies_blueprint)
+        movies.services.search_cache = LRUCache(max_entries=256, sizeof=movies.services.search_result_size)
 
         from .authentication import authentication
         app.register_blueprint(authentication.authentication_blueprint)
 
         from .utilities import utilities
         app.register_blueprint(utilities.utilities_blueprint)
+        utilities.fragment_cache = LRUCache(max_entries=32)
+        utilities.application_version = utilities.get_application_version(app.root_path, data_path)
+
+        from .posters import posters
+        app.register_blueprint(posters.posters_blueprint)
 
         # Register a callback the makes sure that database sessions are associated with http requests
         # We reset the session inside the database repository before a new flask request is generated
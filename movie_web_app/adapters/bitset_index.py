@@ -0,0 +1,69 @@
+def count(bits: int):
+    """ Returns the number of ranks in a bitset. """
+    return bin(bits).count('1')
+
+
+def to_ranks(bits: int):
+    """ Returns the ranks in a bitset, in ascending order. """
+    # Reversed binary digits have the bit of rank 0 first; str.find skips over runs of zeros at C speed.
+    digits = bin(bits)[:1:-1]
+    ranks = list()
+    rank = digits.find('1')
+    while rank != -1:
+        ranks.append(rank)
+        rank = digits.find('1', rank + 1)
+    return ranks
+
+
+def contains(bits: int, rank: int):
+    return bits >> rank & 1 == 1
+
+
+def set_bit(bitset: bytearray, rank: int):
+    byte = rank >> 3
+    if byte >= len(bitset):
+        bitset.extend(bytes(byte + 1 - len(bitset)))
+    bitset[byte] |= 1 << (rank & 7)
+
+
+class BitsetIndex:
+    """ Index from facet values (such as years or genres) to the set of ranks of their movies, as bitsets.
+
+    Bit r of a value's bitset is set if the movie of rank r has that value, so a set of n movies takes n/8 bytes
+    however many of them have the value. Bitsets are built up in mutable bytearrays, so that adding a movie sets a
+    single bit, and are handed out as Python ints, whose AND, OR and bit counting run over machine words rather than
+    Python objects. The int form of a bitset is cached until a movie with the value is added.
+
+    Bitsets suit facets with few values, each shared by many movies; for facets with many values and a few movies
+    each, sorted rank lists are more compact.
+    """
+
+    def __init__(self):
+        self.__bitsets = dict()
+        self.__ints = dict()
+
+    def add(self, value, rank: int):
+        bitset = self.__bitsets.get(value)
+        if bitset is None:
+            bitset = self.__bitsets[value] = bytearray()
+        set_bit(bitset, rank)
+        self.__ints.pop(value, None)
+
+    def get(self, value):
+        """ Returns the bitset of the movies with value, as an int. """
+        bits = self.__ints.get(value)
+        if bits is None:
+            bitset = self.__bitsets.get(value)
+            if bitset is None:
+                return 0
+            bits = self.__ints[value] = int.from_bytes(bitset, 'little')
+        return bits
+
+    def values(self):
+        return self.__bitsets.keys()
+
+    def __contains__(self, value):
+        return value in self.__bitsets
+
+    def __len__(self):
+        return len(self.__bitsets)
@@ -0,0 +1,79 @@
+from array import array
+from itertools import compress
+
+# Type code of the array holding each attribute: 64-bit integers for whole numbers, doubles for the others.
+COLUMN_TYPES = {
+    'release_year': 'q',
+    'runtime': 'q',
+    'rating': 'd',
+    'votes': 'q',
+    'revenue': 'd',
+    'metascore': 'q',
+}
+
+
+class ColumnStore:
+    """ Numeric attributes of movies, stored column by column in arrays indexed by rank.
+
+    Each column is a compact array of machine numbers rather than a Python object per value, and has a bytearray
+    marking the ranks with a value, as some movies have no known revenue or metascore. Aggregates are computed by
+    gathering and summing whole columns with builtins, which loop in C rather than over Movie objects in Python.
+    """
+
+    def __init__(self):
+        self.__columns = {attribute: array(type_code) for attribute, type_code in COLUMN_TYPES.items()}
+        self.__present = {attribute: bytearray() for attribute in COLUMN_TYPES}
+        self.__size = 0
+
+    def set(self, rank: int, values: dict):
+        """ Stores the values of the movie of rank, given as a dict from attribute to value or None. """
+        if rank >= self.__size:
+            # Grow every column to cover the rank; gaps are ranks without values.
+            growth = rank + 1 - self.__size
+            for attribute, column in self.__columns.items():
+                column.extend(array(column.typecode, bytes(growth * column.itemsize)))
+                self.__present[attribute].extend(bytes(growth))
+            self.__size = rank + 1
+
+        for attribute, value in values.items():
+            present = value is not None
+            self.__columns[attribute][rank] = value if present else 0
+            self.__present[attribute][rank] = present
+
+    def get(self, attribute: str, rank: int):
+        """ Returns the value of attribute for the movie of rank, or None if it has none. """
+        if rank < self.__size and self.__present[attribute][rank]:
+            return self.__columns[attribute][rank]
+        return None
+
+    def select(self, ranks, attribute: str, minimum=None, maximum=None):
+        """ Returns the ranks, of those given, of the movies with attribute from minimum to maximum inclusive. """
+        column = self.__columns[attribute]
+        present = self.__present[attribute]
+        if minimum is None:
+            minimum = float('-inf')
+        if maximum is None:
+            maximum = float('inf')
+        # Without NumPy there is no vectorised comparison, and masks built with map and compress are slower than this
+        # comprehension, as each value is boxed for its comparison either way (see benchmarks/column_store.py).
+        return [rank for rank in ranks if rank < self.__size and present[rank] and minimum <= column[rank] <= maximum]
+
+    def statistics(self, attribute: str, ranks=None):
+        """ Returns the number of movies with attribute, and its minimum, maximum and mean, as a dict.
+
+        Only the movies of the given ranks are included, or every movie if ranks is None.
+        """
+        column = self.__columns[attribute]
+        present = self.__present[attribute]
+        if ranks is None:
+            values = list(compress(column, present))
+        else:
+            ranks = [rank for rank in ranks if rank < self.__size]
+            values = list(compress(map(column.__getitem__, ranks), map(present.__getitem__, ranks)))
+
+        if len(values) == 0:
+            return {'count': 0, 'minimum': None, 'maximum': None, 'mean': None}
+        return {'count': len(values), 'minimum': min(values), 'maximum': max(values), 'mean': sum(values) / len(values)}
+
+    def __len__(self):
+        return self.__size
@@ -13,12 +13,34 @@ from sqlalchemy.orm import scoped_session
 from flask import _app_ctx_stack
 
 from movie_web_app.domain.model import Movie, Director, Actor, Genre, User, Review, WatchList
-from movie_web_app.adapters.repository import AbstractRepository
+from movie_web_app.adapters import orm
+from movie_web_app.adapters.repository import AbstractRepository, RepositoryException, RANGE_ATTRIBUTES
+from movie_web_app.adapters.search_index import tokenize, FIELDS, FIELD_BOOSTS, TrigramIndex, PrefixIndex
 from movie_web_app.domain.movie_file_csv_reader import MovieFileCSVReader
 
 tags = None
 
 
+def range_conditions(ranges):
+    """ Returns a WHERE condition, and its parameters, for the (column, minimum, maximum) ranges given.
+
+    Either bound of a range may be None, to leave that end open.
+    """
+    # Only the bounds given appear in the condition, so that SQLite can answer it with a range scan of an index.
+    conditions = ['1 = 1']
+    parameters = dict()
+    for column, minimum, maximum in ranges:
+        if minimum is None and maximum is None:
+            conditions.append('{} IS NOT NULL'.format(column))
+        if minimum is not None:
+            conditions.append('{0} >= :minimum_{0}'.format(column))
+            parameters['minimum_' + column] = minimum
+        if maximum is not None:
+            conditions.append('{0} <= :maximum_{0}'.format(column))
+            parameters['maximum_' + column] = maximum
+    return ' AND '.join(conditions), parameters
+
+
 class SessionContextManager:
     def __init__(self, session_factory):
         self.__session_factory = session_factory
@@ -55,6 +77,9 @@ class SqlAlchemyRepository(AbstractRepository):
 
     def __init__(self, session_factory):
         self._session_cm = SessionContextManager(session_factory)
+        self._trigram_index = None
+        self._prefix_index = None
+        self._name_indexes_version = None
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -109,13 +134,24 @@ class SqlAlchemyRepository(AbstractRepository):
         number_of_movies = self._session_cm.session.query(Movie).count()
         return number_of_movies
 
-    #def add_movie_rank(self, rank, movie):
-    #    self.__rank_of_movies[rank] = movie
+    def add_movie_rank(self, rank, movie):
+        # A movie's rank is the primary key of the movies table, so it is stored when the movie itself is added.
+        pass
 
     def all_movies(self):
         movies = self._session_cm.session.query(Movie).all()
         return movies
 
+    def get_catalog_version(self):
+        return self._get_version('catalog')
+
+    def _get_version(self, name: str):
+        # Versions are kept in the database by triggers (see orm.py), so they also change when another process, or
+        # populate(), writes to it.
+        row = self._session_cm.session.execute('SELECT value FROM versions WHERE name = :name',
+                                               {'name': name}).fetchone()
+        return 0 if row is None else row[0]
+
     def get_first_movie(self):
         movie = self._session_cm.session.query(Movie).first()
         return movie
@@ -124,20 +160,72 @@ class SqlAlchemyRepository(AbstractRepository):
         movie = self._session_cm.session.query(Movie).order_by(desc(Movie.__rank)).first()
         return movie
 
-    #def add_release_year(self, year):
-    #    if year not in self.__dataset_of_release_years:
-    #        self.__dataset_of_release_years.append(year)
-
-    #def get_year_list(self):
-    #    year = self._session_cm.session.query(Movie.__release_year).order_by(asc(Movie.__release_year)).all()
-    #    return year
+    def add_release_year(self, year):
+        with self._session_cm as scm:
+            scm.session.execute('INSERT OR IGNORE INTO release_year (year) VALUES (:year)', {'year': year})
+            scm.commit()
 
-    #def get_genre_list(self):
-    #    genre_list = list()
-    #    for genre in self.__movies_with_given_genre.keys():
-    ##        genre_list.append(genre)
-    #    genre_list.sort()
-    #    return genre_list
+    def get_year_list(self):
+        rows = self._session_cm.session.execute('SELECT DISTINCT release_year FROM movies '
+                                                'ORDER BY release_year ASC').fetchall()
+        return [row[0] for row in rows]
+
+    def get_genre_list(self):
+        rows = self._session_cm.session.execute('SELECT DISTINCT name FROM genres ORDER BY name ASC').fetchall()
+        return [row[0] for row in rows]
+
+    def get_years_in_range(self, first_year=None, last_year=None):
+        condition, parameters = range_conditions([('release_year', first_year, last_year)])
+        rows = self._session_cm.session.execute('SELECT DISTINCT release_year FROM movies WHERE {} '
+                                                'ORDER BY release_year ASC'.format(condition), parameters).fetchall()
+        return [row[0] for row in rows]
+
+    def get_movies_with_years_in_range(self, first_year=None, last_year=None):
+        condition, parameters = range_conditions([('release_year', first_year, last_year)])
+        rows = self._session_cm.session.execute('SELECT rank FROM movies WHERE {} '
+                                                'ORDER BY rank ASC'.format(condition), parameters).fetchall()
+        return [row[0] for row in rows]
+
+    def get_movies_in_ranges(self, ranges: dict):
+        for attribute in ranges:
+            if attribute not in RANGE_ATTRIBUTES:
+                raise RepositoryException('Movies cannot be filtered on {}'.format(attribute))
+
+        # Each attribute is an indexed column of movies of the same name.
+        condition, parameters = range_conditions(
+            [(attribute, minimum, maximum) for attribute, (minimum, maximum) in ranges.items()])
+        rows = self._session_cm.session.execute('SELECT rank FROM movies WHERE {} '
+                                                'ORDER BY rank ASC'.format(condition), parameters).fetchall()
+        return [row[0] for row in rows]
+
+    def get_movies_sorted_by(self, attribute: str, offset: int = 0, limit: int = None, descending: bool = True):
+        if attribute not in RANGE_ATTRIBUTES:
+            raise RepositoryException('Movies cannot be sorted on {}'.format(attribute))
+
+        # Walking the index on the attribute yields the movies in order, so only the rows of the page are read. Movies
+        # with equal values are listed in order of rank either way, as in the memory repository.
+        direction = 'DESC' if descending else 'ASC'
+        rows = self._session_cm.session.execute(
+            'SELECT rank FROM movies WHERE {0} IS NOT NULL ORDER BY {0} {1}, rank ASC '
+            'LIMIT :limit OFFSET :offset'.format(attribute, direction),
+            {'limit': -1 if limit is None else limit, 'offset': max(0, offset)}
+        ).fetchall()
+        number_of_movies = self._session_cm.session.execute(
+            'SELECT COUNT({}) FROM movies'.format(attribute)).scalar()
+        return [row[0] for row in rows], number_of_movies
+
+    def get_movie_statistics(self, attribute: str, movie_ranks=None):
+        if attribute not in RANGE_ATTRIBUTES:
+            raise RepositoryException('Movies cannot be summarised on {}'.format(attribute))
+
+        condition = '1 = 1'
+        if movie_ranks is not None:
+            # Ranks are ints, so they can be written into the statement, however many there are.
+            condition = 'rank IN ({})'.format(', '.join(str(int(rank)) for rank in movie_ranks) or 'NULL')
+        row = self._session_cm.session.execute(
+            'SELECT COUNT({0}), MIN({0}), MAX({0}), AVG({0}) FROM movies WHERE {1}'.format(attribute, condition)
+        ).fetchone()
+        return {'count': row[0], 'minimum': row[1], 'maximum': row[2], 'mean': row[3]}
 
     #def add_movie_with_release_year(self, movie, year):
     #    if year not in self.__movies_with_given_year.keys():
@@ -236,16 +324,113 @@ class SqlAlchemyRepository(AbstractRepository):
             movie_ranks = [id[0] for id in movie_ranks]
         return movie_ranks
 
+    def filter_movies(self, release_year=None, genre=None, director=None, actor=None, facet_limit: int = 10):
+        # Each filter selects the ranks of its movies; SQLite intersects them, using the indexes on the association
+        # tables' movie and name columns.
+        facet_queries = {
+            'release_year': 'SELECT rank AS movie_id, release_year AS value FROM movies',
+            'genre': 'SELECT movie_id, name AS value FROM movie_genres JOIN genres ON genres.id = genre_id',
+            'director': 'SELECT movie_id, name AS value FROM movie_director JOIN directors ON directors.id = director_id',
+            'actor': 'SELECT movie_id, name AS value FROM movie_actors JOIN actors ON actors.id = actor_id',
+        }
+        filters = {'release_year': release_year, 'genre': genre, 'director': director, 'actor': actor}
+
+        selections = list()
+        parameters = {'facet_limit': facet_limit}
+        for facet, value in filters.items():
+            if value is not None:
+                selections.append('SELECT movie_id FROM ({}) WHERE value = :{}'.format(facet_queries[facet], facet))
+                parameters[facet] = value
+        if len(selections) == 0:
+            selections.append('SELECT rank FROM movies')
+        matching_movies = ' INTERSECT '.join(selections)
+
+        rows = self._session_cm.session.execute(matching_movies + ' ORDER BY 1', parameters).fetchall()
+        movie_ranks = [row[0] for row in rows]
+
+        facet_counts = dict()
+        for facet, value in filters.items():
+            if value is None:
+                rows = self._session_cm.session.execute(
+                    'SELECT value, COUNT(DISTINCT movie_id) AS movies FROM ({}) WHERE movie_id IN ({}) '
+                    'GROUP BY value ORDER BY movies DESC, value ASC LIMIT :facet_limit'.format(
+                        facet_queries[facet], matching_movies), parameters).fetchall()
+                facet_counts[facet] = [(row[0], row[1]) for row in rows]
+
+        return movie_ranks, facet_counts
+
+    def search_movies(self, query: str, limit: int = None, offset: int = 0):
+        tokens = sorted(set(tokenize(query)))
+        if len(tokens) == 0:
+            return list(), 0
+
+        # Quote each word, so that FTS5 matches it literally and requires all of them.
+        match = ' '.join('"{}"'.format(token) for token in tokens)
+        number_of_results = self._session_cm.session.execute(
+            'SELECT COUNT(*) FROM movies_fts WHERE movies_fts MATCH :match', {'match': match}).scalar()
+
+        # bm25() is lower for better matches; its arguments weight the columns like the FIELD_BOOSTS of memory mode.
+        rows = self._session_cm.session.execute(
+            'SELECT rowid FROM movies_fts WHERE movies_fts MATCH :match '
+            'ORDER BY bm25(movies_fts, {}), rowid ASC LIMIT :limit OFFSET :offset'.format(
+                ', '.join(str(FIELD_BOOSTS[field]) for field in FIELDS)),
+            {'match': match, 'limit': -1 if limit is None else limit, 'offset': offset}).fetchall()
+        return [row[0] for row in rows], number_of_results
+
+    def _get_name_indexes(self):
+        # SQLite has neither trigram similarity nor popularity ranked prefix completion, so titles and names are read
+        # into indexes in this process. They are rebuilt whenever the catalog version in the database changes.
+        catalog_version = self.get_catalog_version()
+        if self._name_indexes_version is None or self._name_indexes_version != catalog_version:
+            trigram_index = TrigramIndex()
+            prefix_index = PrefixIndex()
+            rows = self._session_cm.session.execute(
+                "SELECT rank, 'title', title, votes FROM movies "
+                "UNION ALL SELECT movie_id, 'director', name, votes FROM movie_director "
+                'JOIN directors ON directors.id = director_id JOIN movies ON movies.rank = movie_id '
+                "UNION ALL SELECT movie_id, 'actor', name, votes FROM movie_actors "
+                'JOIN actors ON actors.id = actor_id JOIN movies ON movies.rank = movie_id').fetchall()
+            for rank, kind, name, votes in rows:
+                trigram_index.add(name, rank)
+                prefix_index.add(name, kind, rank, votes)
+            self._trigram_index = trigram_index
+            self._prefix_index = prefix_index
+            self._name_indexes_version = catalog_version
+
+        return self._trigram_index, self._prefix_index
+
+    def search_similar_movies(self, query: str, limit: int = None, offset: int = 0):
+        trigram_index, prefix_index = self._get_name_indexes()
+        movie_ranks = trigram_index.search(query)
+        end = None if limit is None else offset + limit
+        return movie_ranks[offset:end], len(movie_ranks)
+
+    def get_completions(self, prefix: str, limit: int = 10):
+        trigram_index, prefix_index = self._get_name_indexes()
+        return prefix_index.complete(prefix, limit)
+
     def add_review(self, review: Review):
         super().add_review(review)
         with self._session_cm as scm:
             scm.session.add(review)
             scm.commit()
 
+    def get_review_version(self):
+        return self._get_version('reviews')
+
     def get_review(self):
         reviews = self._session_cm.session.query(Review).all()
         return reviews
 
+    def get_reviews_for_movie(self, movie_rank: int):
+        # Both lookups use the indexes on reviews.movie_id and reviews.user_id.
+        return self._session_cm.session.query(Review).filter(orm.reviews.c.movie_id == movie_rank) \
+            .order_by(orm.reviews.c.id).all()
+
+    def get_reviews_for_user(self, username):
+        return self._session_cm.session.query(Review).join(orm.users, orm.users.c.id == orm.reviews.c.user_id) \
+            .filter(orm.users.c.username == username).order_by(orm.reviews.c.id).all()
+
     def have_review(self, review):
         result = self._session_cm.session.query(Review).filter(Review.__review_text.in_(review)).all()
         if len(review) > 0:
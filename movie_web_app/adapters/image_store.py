@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+import time
+
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+store_instance = None
+
+# Poster images are a few hundred kilobytes at most; anything much larger is not a poster.
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Disk budget for cached images when none is configured.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Number of locks that downloads are serialised on, each shared by the URLs hashing to it.
+URL_LOCK_STRIPES = 64
+
+# Poster URLs come from OMDb responses; anything but a web URL (such as file:// or ftp://) is not fetched.
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+class ImageDownloadException(Exception):
+    pass
+
+
+def download_image(url: str, timeout: float = 5):
+    """ Returns (content, mimetype) of the image at url.
+
+    Raises ImageDownloadException if url is not an http or https URL, the image could not be downloaded, or the
+    response is not an image.
+    """
+    if urlsplit(url).scheme.lower() not in ALLOWED_SCHEMES:
+        raise ImageDownloadException('{} is not an http or https URL'.format(url))
+
+    try:
+        response = urlopen(url, timeout=timeout)
+        mimetype = response.headers.get_content_type()
+        content = response.read(MAX_IMAGE_BYTES + 1)
+    except Exception as e:
+        raise ImageDownloadException(e)
+
+    if not mimetype.startswith('image/') or len(content) > MAX_IMAGE_BYTES:
+        raise ImageDownloadException('{} is not a poster image'.format(url))
+    return content, mimetype
+
+
+class ImageStore:
+    """ Content-addressed disk cache of downloaded images, bounded to max_bytes in total.
+
+    Each image is stored once under the SHA-256 digest of its content, next to a small index file per source URL that
+    names the digest and mimetype. When the store grows beyond max_bytes the least recently served images are evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, downloader=download_image):
+        self.__objects_directory = os.path.join(directory, 'objects')
+        self.__urls_directory = os.path.join(directory, 'urls')
+        os.makedirs(self.__objects_directory, exist_ok=True)
+        os.makedirs(self.__urls_directory, exist_ok=True)
+        self.__max_bytes = max_bytes
+        self.__downloader = downloader
+        self.__lock = threading.Lock()
+        self.__url_locks = [threading.Lock() for _ in range(URL_LOCK_STRIPES)]
+        self.__total_bytes = 0
+        for entry in os.scandir(self.__objects_directory):
+            if entry.name.endswith('.tmp'):
+                # Left behind by a download interrupted before its image was moved into place.
+                os.remove(entry.path)
+            else:
+                self.__total_bytes += entry.stat().st_size
+        self.__hits = 0
+        self.__downloads = 0
+        self.__evictions = 0
+
+    def get_image(self, url: str):
+        """ Returns (path, mimetype, digest) of the cached copy of the image at url, downloading it if needed.
+
+        Raises ImageDownloadException if the image isn't cached and can't be downloaded.
+        """
+        with self.__lock_for(url):
+            entry = self.__read_index(url)
+            if entry is not None:
+                try:
+                    # Record the access, so that eviction removes the least recently served images first.
+                    os.utime(entry[0])
+                except FileNotFoundError:
+                    # Evicted since the index was read; download the image again.
+                    entry = None
+            if entry is not None:
+                with self.__lock:
+                    self.__hits += 1
+                return entry
+
+            content, mimetype = self.__downloader(url)
+            return self.__store(url, content, mimetype)
+
+    def __lock_for(self, url: str):
+        # Concurrent requests for the same poster share a lock, so the poster is downloaded once. A fixed set of locks
+        # keeps memory bounded however many URLs are served, at the cost of some unrelated downloads waiting on each
+        # other.
+        return self.__url_locks[hash(url) % len(self.__url_locks)]
+
+    def __index_path(self, url: str):
+        return os.path.join(self.__urls_directory, hashlib.sha256(url.encode('UTF-8')).hexdigest())
+
+    def __read_index(self, url: str):
+        try:
+            with open(self.__index_path(url)) as index_file:
+                digest, mimetype = index_file.read().split()
+        except (OSError, ValueError):
+            return None
+
+        path = os.path.join(self.__objects_directory, digest)
+        if not os.path.exists(path):
+            # The image itself has been evicted.
+            return None
+        return path, mimetype, digest
+
+    def __store(self, url: str, content: bytes, mimetype: str):
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.__objects_directory, digest)
+
+        if not os.path.exists(path):
+            temporary_path = '{}.{}.tmp'.format(path, threading.get_ident())
+            with open(temporary_path, 'wb') as image_file:
+                image_file.write(content)
+            # Checked again under the lock, so that two URLs with the same image only count its bytes once.
+            with self.__lock:
+                if os.path.exists(path):
+                    os.remove(temporary_path)
+                else:
+                    os.replace(temporary_path, path)
+                    self.__total_bytes += len(content)
+
+        with open(self.__index_path(url), 'w') as index_file:
+            index_file.write('{} {}'.format(digest, mimetype))
+
+        with self.__lock:
+            self.__downloads += 1
+        self.__evict(keep=path)
+        return path, mimetype, digest
+
+    def __evict(self, keep: str):
+        with self.__lock:
+            if self.__total_bytes <= self.__max_bytes:
+                return
+
+            # Evict down to 90% of the budget, so that eviction doesn't run again on the very next download.
+            target_bytes = self.__max_bytes * 9 // 10
+            # Temporary files are downloads still being written, which aren't counted yet.
+            entries = sorted((entry for entry in os.scandir(self.__objects_directory)
+                              if not entry.name.endswith('.tmp')), key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self.__total_bytes <= target_bytes:
+                    break
+                if entry.path == keep:
+                    continue
+                size = entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self.__total_bytes -= size
+                self.__evictions += 1
+
+    @property
+    def stats(self):
+        with self.__lock:
+            return {
+                'bytes': self.__total_bytes,
+                'max_bytes': self.__max_bytes,
+                'hits': self.__hits,
+                'downloads': self.__downloads,
+                'evictions': self.__evictions,
+            }
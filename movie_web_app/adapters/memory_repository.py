@@ -1,45 +1,86 @@
 import csv
 import os
 
+from collections import Counter
 from typing import List, Dict, Set
 
 from bisect import bisect, bisect_left, insort_left
 
 from werkzeug.security import generate_password_hash
 
-from movie_web_app.adapters.repository import AbstractRepository, RepositoryException
+from movie_web_app.adapters.bitset_index import BitsetIndex, count, to_ranks, contains
+from movie_web_app.adapters.column_store import ColumnStore
+from movie_web_app.adapters.range_index import RangeIndex
+from movie_web_app.adapters.repository import AbstractRepository, RepositoryException, RANGE_ATTRIBUTES
+from movie_web_app.adapters.search_index import SearchIndex, TrigramIndex, PrefixIndex, intersect
 from movie_web_app.domain.movie_file_csv_reader import MovieFileCSVReader
 from movie_web_app.domain.model import Movie, Director, Actor, Genre, User, Review, WatchList, make_review
 
+# The Movie property holding each attribute that movies can be filtered on by range and summarised.
+MOVIE_ATTRIBUTES = {
+    'release_year': 'release_year',
+    'runtime': 'runtime_minutes',
+    'rating': 'rating',
+    'votes': 'votes',
+    'revenue': 'revenue',
+    'metascore': 'metascores',
+}
+
+
 class MemoryRepository(AbstractRepository):
 
     def __init__(self):
         self.__dataset_of_movies: List(Movie) = list()
+        # Kept sorted and free of duplicates as years and genres are added, so listing them needs no sorting.
         self.__dataset_of_release_years = list()
+        self.__dataset_of_genre_names = list()
         self.__rank_of_movies: Dict(Movie) = dict()
         self.__movie_details = dict()
         self.__dataset_of_actors: Set(Actor) = set()
         self.__dataset_of_directors: Set(Director) = set()
         self.__dataset_of_genres: Set(Genre) = set()
-        self.__movies_with_given_year: Dict(Movie) = dict()
+        # Years and genres are shared by many movies each, so their movies are kept as bitsets; directors and actors
+        # have a few movies each, kept as sorted lists of ranks.
+        self.__movies_with_given_year = BitsetIndex()
         self.__movies_with_given_director: Dict(Movie) = dict()
         self.__movies_with_given_actor: Dict(Movie) = dict()
-        self.__movies_with_given_genre: Dict(Movie) = dict()
+        self.__movies_with_given_genre = BitsetIndex()
+        self.__search_index = SearchIndex()
+        self.__trigram_index = TrigramIndex()
+        self.__prefix_index = PrefixIndex()
+        self.__range_indexes = {attribute: RangeIndex() for attribute in RANGE_ATTRIBUTES}
+        self.__columns = ColumnStore()
         self.__users = list()
+        self.__users_by_name: Dict(User) = dict()
         self.__reviews = list()
+        self.__reviews_by_movie: Dict(Review) = dict()
+        self.__reviews_by_user: Dict(Review) = dict()
+        self.__review_keys = set()
         self.__user_watch_list: Dict(WatchList) = dict()
+        self.__catalog_version = 0
+        self.__review_version = 0
 
     def add_user(self, user: User):
         self.__users.append(user)
+        # The first user added under a name keeps it, as when users were looked up by scanning the list.
+        self.__users_by_name.setdefault(user.user_name, user)
 
     def get_user(self, username) -> User:
-        return next((user for user in self.__users if user.user_name == username), None)
+        return self.__users_by_name.get(username)
 
     def get_all_users(self):
         return self.__users
 
     def add_movie(self, movie: Movie):
         self.__dataset_of_movies.append(movie)
+        self.__search_index.add_movie(movie)
+        self.__trigram_index.add_movie(movie)
+        self.__prefix_index.add_movie(movie)
+        values = {attribute: getattr(movie, MOVIE_ATTRIBUTES[attribute]) for attribute in RANGE_ATTRIBUTES}
+        self.__columns.set(movie.rank, values)
+        for attribute, index in self.__range_indexes.items():
+            index.add(values[attribute], movie.rank)
+        self.__catalog_version += 1
 
     def get_movie(self, rank: int):
         movie = None
@@ -60,10 +101,14 @@ class MemoryRepository(AbstractRepository):
 
     def add_movie_rank(self,rank,movie):
         self.__rank_of_movies[rank] = movie
+        self.__catalog_version += 1
 
     def all_movies(self):
         return self.__dataset_of_movies
 
+    def get_catalog_version(self):
+        return self.__catalog_version
+
     #def add_movie_details(self,movie,details):
     #    self.__movie_details[movie] = details
 
@@ -79,71 +124,193 @@ class MemoryRepository(AbstractRepository):
         return self.get_movie(1000)
 
     def add_release_year(self, year):
-        if year not in self.__dataset_of_release_years:
-            self.__dataset_of_release_years.append(year)
+        if insort_unique(self.__dataset_of_release_years, year):
+            self.__catalog_version += 1
 
     def get_year_list(self):
-        self.__dataset_of_release_years.sort()
         return self.__dataset_of_release_years
 
     def get_genre_list(self):
-        genre_list = list()
-        for genre in self.__movies_with_given_genre.keys():
-            genre_list.append(genre)
-        genre_list.sort()
-        return genre_list
+        return self.__dataset_of_genre_names
+
+    def get_years_in_range(self, first_year=None, last_year=None):
+        years = self.__dataset_of_release_years
+        start = 0 if first_year is None else bisect_left(years, first_year)
+        end = len(years) if last_year is None else bisect(years, last_year)
+        return years[start:end]
+
+    def get_movies_with_years_in_range(self, first_year=None, last_year=None):
+        bits = 0
+        for year in self.get_years_in_range(first_year, last_year):
+            bits |= self.__movies_with_given_year.get(year)
+        return to_ranks(bits)
 
     def add_movie_with_release_year(self,movie,year):
-        if year not in self.__movies_with_given_year.keys():
-            self.__movies_with_given_year[year] = [movie.rank]
-        else:
-            self.__movies_with_given_year[year].append(movie.rank)
+        self.__catalog_version += 1
+        self.__movies_with_given_year.add(year, movie.rank)
 
     def get_movie_with_given_year(self, year):
-        if year in self.__dataset_of_release_years:
-            return self.__movies_with_given_year[year]
-        else:
-            return list()
+        return to_ranks(self.__movies_with_given_year.get(year))
+
+    def get_movies_in_ranges(self, ranges: dict):
+        range_queries = list()
+        for attribute, (minimum, maximum) in ranges.items():
+            if attribute not in self.__range_indexes:
+                raise RepositoryException('Movies cannot be filtered on {}'.format(attribute))
+            index = self.__range_indexes[attribute]
+            range_queries.append((index.count(minimum, maximum), attribute, minimum, maximum))
+        if len(range_queries) == 0:
+            return sorted(self.__rank_of_movies)
+
+        # Only the narrowest range is read from its index; the movies in it are checked against the other ranges in
+        # the columns.
+        range_queries.sort(key=lambda range_query: range_query[0])
+        number_of_movies, attribute, minimum, maximum = range_queries[0]
+        movie_ranks = self.__range_indexes[attribute].ranks(minimum, maximum)
+        for number_of_movies, attribute, minimum, maximum in range_queries[1:]:
+            movie_ranks = self.__columns.select(movie_ranks, attribute, minimum, maximum)
+        return sorted(movie_ranks)
+
+    def get_movies_sorted_by(self, attribute: str, offset: int = 0, limit: int = None, descending: bool = True):
+        if attribute not in self.__range_indexes:
+            raise RepositoryException('Movies cannot be sorted on {}'.format(attribute))
+        # The range index of an attribute keeps its movies in order, so a page is a slice of it.
+        index = self.__range_indexes[attribute]
+        return index.page(offset, limit, descending), len(index)
+
+    def get_movie_statistics(self, attribute: str, movie_ranks=None):
+        if attribute not in self.__range_indexes:
+            raise RepositoryException('Movies cannot be summarised on {}'.format(attribute))
+        return self.__columns.statistics(attribute, movie_ranks)
 
     def add_movie_with_actor(self,movie,actors):
+        self.__catalog_version += 1
         for actor in actors:
             if actor not in self.__movies_with_given_actor:
                 self.__movies_with_given_actor[actor] = [movie.rank]
             else:
-                self.__movies_with_given_actor[actor].append(movie.rank)
+                insort_left(self.__movies_with_given_actor[actor], movie.rank)
 
     def get_movie_with_given_actor(self, actor):
-        return self.__movies_with_given_actor[actor]
+        return self.__movies_with_given_actor.get(actor, list())
 
     def add_movie_with_director(self,movie,director):
+        self.__catalog_version += 1
         if director not in self.__movies_with_given_director:
             self.__movies_with_given_director[director] = [movie.rank]
         else:
-            self.__movies_with_given_director[director].append(movie.rank)
+            insort_left(self.__movies_with_given_director[director], movie.rank)
 
     def get_movie_with_given_director(self, director):
-        return self.__movies_with_given_director[director]
+        return self.__movies_with_given_director.get(director, list())
 
     def add_movie_with_genre(self,movie,genres):
+        self.__catalog_version += 1
         for genre in genres:
-            if genre not in self.__movies_with_given_genre:
-                self.__movies_with_given_genre[genre] = [movie.rank]
-            else:
-                self.__movies_with_given_genre[genre].append(movie.rank)
+            self.__movies_with_given_genre.add(genre, movie.rank)
+            insort_unique(self.__dataset_of_genre_names, genre)
 
     def get_movie_with_given_genre(self, genre):
-        return self.__movies_with_given_genre[genre]
+        return to_ranks(self.__movies_with_given_genre.get(genre))
+
+    def filter_movies(self, release_year=None, genre=None, director=None, actor=None, facet_limit: int = 10):
+        filters = {'release_year': release_year, 'genre': genre, 'director': director, 'actor': actor}
+        bitset_indexes = {'release_year': self.__movies_with_given_year, 'genre': self.__movies_with_given_genre}
+        list_indexes = {'director': self.__movies_with_given_director, 'actor': self.__movies_with_given_actor}
+
+        # Year and genre filters are ANDed as bitsets, director and actor filters intersected as sorted lists.
+        match_bits = None
+        for facet, index in bitset_indexes.items():
+            if filters[facet] is not None:
+                bits = index.get(filters[facet])
+                match_bits = bits if match_bits is None else match_bits & bits
+        posting_lists = [index.get(filters[facet], list()) for facet, index in list_indexes.items()
+                         if filters[facet] is not None]
+
+        if len(posting_lists) > 0:
+            # Start from the shortest list, so that each intersection works on as few ranks as possible.
+            posting_lists.sort(key=len)
+            movie_ranks = posting_lists[0]
+            for postings in posting_lists[1:]:
+                movie_ranks = intersect(movie_ranks, postings)
+            if match_bits is None:
+                movie_ranks = list(movie_ranks)
+            else:
+                movie_ranks = [rank for rank in movie_ranks if contains(match_bits, rank)]
+                match_bits = None
+        elif match_bits is not None:
+            movie_ranks = to_ranks(match_bits)
+        else:
+            movie_ranks = sorted(self.__rank_of_movies)
+
+        facet_counts = dict()
+        for facet, value in filters.items():
+            if value is not None:
+                continue
+            if facet in bitset_indexes and match_bits is not None:
+                # Counting the bits each value shares with the matches never touches the movies themselves.
+                index = bitset_indexes[facet]
+                counts = [(facet_value, count(index.get(facet_value) & match_bits)) for facet_value in index.values()]
+                counts = [(facet_value, number) for facet_value, number in counts if number > 0]
+            elif len(movie_ranks) == len(self.__rank_of_movies):
+                # Nothing is filtered out, so the counts are the sizes of the indexes' entries.
+                if facet in bitset_indexes:
+                    index = bitset_indexes[facet]
+                    counts = [(facet_value, count(index.get(facet_value))) for facet_value in index.values()]
+                else:
+                    counts = [(facet_value, len(ranks)) for facet_value, ranks in list_indexes[facet].items()]
+            else:
+                counter = Counter()
+                for rank in movie_ranks:
+                    counter.update(self.__facet_values(self.__rank_of_movies[rank], facet))
+                counts = counter.items()
+            facet_counts[facet] = sorted(counts, key=lambda item: (-item[1], item[0]))[:facet_limit]
+
+        return movie_ranks, facet_counts
+
+    def __facet_values(self, movie, facet):
+        if facet == 'release_year':
+            return [movie.release_year]
+        if facet == 'genre':
+            return set(movie.genres)
+        if facet == 'director':
+            return [movie.director]
+        return set(movie.actors)
+
+    def search_movies(self, query: str, limit: int = None, offset: int = 0):
+        movie_ranks, number_of_results = self.__search_index.search(query, None if limit is None else offset + limit)
+        return movie_ranks[offset:], number_of_results
+
+    def search_similar_movies(self, query: str, limit: int = None, offset: int = 0):
+        movie_ranks = self.__trigram_index.search(query)
+        end = None if limit is None else offset + limit
+        return movie_ranks[offset:end], len(movie_ranks)
+
+    def get_completions(self, prefix: str, limit: int = 10):
+        return self.__prefix_index.complete(prefix, limit)
 
     def add_review(self, review: Review):
         super().add_review(review)
         self.__reviews.append(review)
+        self.__reviews_by_movie.setdefault(review.movie.rank, list()).append(review)
+        self.__reviews_by_user.setdefault(review.user.user_name, list()).append(review)
+        self.__review_keys.add(review_key(review))
+        self.__review_version += 1
+
+    def get_review_version(self):
+        return self.__review_version
 
     def get_review(self):
         return self.__reviews
 
+    def get_reviews_for_movie(self, movie_rank: int):
+        return self.__reviews_by_movie.get(movie_rank, list())
+
+    def get_reviews_for_user(self, username):
+        return self.__reviews_by_user.get(username, list())
+
     def have_review(self, review):
-        if review in self.__reviews:
-            return True
+        return review.user is not None and review.movie is not None and review_key(review) in self.__review_keys
 
     #def add_user_watched_movie(self,user,movie):
     #    user.watch_movie(movie)
@@ -183,19 +350,27 @@ def load_movies(data_path:str, repo: MemoryRepository):
         release_year = int(row[6])
         description = row[3]
         runtime = int(row[7])
+        rating = float(row[8])
+        votes = int(row[9])
+        revenue = read_optional_number(row[10], float)
+        metascore = read_optional_number(row[11], int)
         movie = Movie(title, release_year)
         movie.rank = rank
         movie.description = description
         movie.runtime_minutes = runtime
+        movie.rating = rating
+        movie.votes = votes
+        movie.revenue = revenue
+        movie.metascores = metascore
 
         actors = row[5]
-        actors_list = actors.split(',')
+        actors_list = [actor.strip() for actor in actors.split(',')]
         for actor in actors_list:
             movie.add_actor(actor)
         director = row[4]
         movie.director = director
         genres = row[2]
-        genres_list = genres.split(',')
+        genres_list = [genre.strip() for genre in genres.split(',')]
         for genre in genres_list:
             movie.add_genre(genre)
 
@@ -207,7 +382,7 @@ def load_movies(data_path:str, repo: MemoryRepository):
         repo.add_movie_with_release_year(movie,release_year)
 
         # add movie with same actor into movies_with_given_actor
-        repo.add_movie_with_actor(movie,actors)
+        repo.add_movie_with_actor(movie,actors_list)
 
         # add movie with same director into movies_with_given_director
         repo.add_movie_with_director(movie,director)
@@ -223,6 +398,27 @@ def load_movies(data_path:str, repo: MemoryRepository):
         index += 1
 
 
+def read_optional_number(text: str, number_type):
+    # Missing revenues and metascores are given as N/A.
+    if text.strip() in ('', 'N/A'):
+        return None
+    return number_type(text)
+
+
+def insort_unique(values: list, value):
+    """ Inserts value into the sorted list values unless it is already there, and returns whether it was inserted. """
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        return False
+    values.insert(position, value)
+    return True
+
+
+def review_key(review: Review):
+    # Review defines __eq__ but not __hash__, so reviews are looked up by the attributes their equality compares.
+    return review.user.user_name, review.movie.rank, review.review_text, review.rating, review.timestamp
+
+
 def load_users(data_path: str, repo:MemoryRepository):
     users = dict()
 
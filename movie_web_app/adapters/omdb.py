@@ -0,0 +1,223 @@
+import http.client
+import json
+import queue
+import threading
+import time
+import urllib.parse
+
+from bisect import bisect_left
+
+client_instance = None
+
+OMDB_URL = 'http://www.omdbapi.com/'
+
+
+class OmdbException(Exception):
+    pass
+
+
+class OmdbUnavailableException(OmdbException):
+    pass
+
+
+class LatencyHistogram:
+    """ Cumulative request latency histogram with fixed bucket upper bounds (in seconds). """
+
+    BOUNDS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self.__counts = [0] * (len(self.BOUNDS) + 1)
+        self.__total = 0.0
+        self.__lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self.__lock:
+            self.__counts[bisect_left(self.BOUNDS, seconds)] += 1
+            self.__total += seconds
+
+    @property
+    def stats(self):
+        with self.__lock:
+            buckets = dict()
+            cumulative = 0
+            for bound, count in zip(self.BOUNDS + ('+Inf',), self.__counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {'buckets': buckets, 'count': cumulative, 'sum': self.__total}
+
+
+class CircuitBreaker:
+    """ Stops calls to a failing dependency for cool_down seconds after failure_threshold consecutive failures.
+
+    Once the cool-down has passed a single trial call is let through; if it succeeds the breaker closes again,
+    otherwise it re-opens for another cool-down period.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cool_down: float = 30):
+        self.__failure_threshold = failure_threshold
+        self.__cool_down = cool_down
+        self.__failures = 0
+        self.__opened_at = None
+        self.__trial_running = False
+        self.__lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self.__lock:
+            if self.__opened_at is None:
+                return True
+            if self.__trial_running or time.monotonic() - self.__opened_at < self.__cool_down:
+                return False
+            self.__trial_running = True
+            return True
+
+    def record_success(self):
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+            self.__trial_running = False
+
+    def record_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if self.__trial_running or self.__failures >= self.__failure_threshold:
+                self.__opened_at = time.monotonic()
+            self.__trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            if self.__opened_at is None:
+                return 'closed'
+            if self.__trial_running or time.monotonic() - self.__opened_at >= self.__cool_down:
+                return 'half-open'
+            return 'open'
+
+
+class OmdbClient:
+    """ OMDb API client that keeps a pool of keep-alive connections to the API host. """
+
+    def __init__(self, api_key: str, base_url: str = OMDB_URL, timeout: float = 5, pool_size: int = 8,
+                 breaker: CircuitBreaker = None):
+        parts = urllib.parse.urlsplit(base_url)
+        self.__connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.__host = parts.netloc
+        self.__path = parts.path or '/'
+        self.__api_key = api_key
+        self.__timeout = timeout
+        self.__idle_connections = queue.LifoQueue(maxsize=pool_size)
+        self.__breaker = breaker if breaker is not None else CircuitBreaker()
+        self.__latency = LatencyHistogram()
+        self.__lock = threading.Lock()
+        self.__requests = 0
+        self.__failures = 0
+        self.__rejected = 0
+        self.__connections_opened = 0
+
+    def get_poster(self, title: str):
+        """ Returns the poster URL OMDb has for title, or None if OMDb does not know the title.
+
+        Raises OmdbException if OMDb could not be reached or returned an unreadable response, and
+        OmdbUnavailableException without contacting OMDb while the circuit breaker is open.
+        """
+        detail = self.get_movie_detail(title)
+        poster = detail.get('Poster')
+        if poster is None or poster == 'N/A':
+            return None
+        return poster
+
+    def get_movie_detail(self, title: str) -> dict:
+        if not self.__breaker.allow_request():
+            with self.__lock:
+                self.__rejected += 1
+            raise OmdbUnavailableException('OMDb calls suspended after repeated failures')
+
+        query = urllib.parse.urlencode({'t': title, 'apikey': self.__api_key})
+        started = time.perf_counter()
+        try:
+            body = self.__get('{}?{}'.format(self.__path, query))
+            detail = json.loads(body.decode('UTF-8'))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.__record(time.perf_counter() - started, failed=True)
+            raise OmdbException(e)
+
+        self.__record(time.perf_counter() - started, failed=False)
+        return detail
+
+    def __get(self, path: str) -> bytes:
+        connection, reused = self.__acquire()
+        try:
+            response, body = self.__send(connection, path)
+        except (OSError, http.client.HTTPException):
+            if not reused:
+                raise
+            # The server may have closed an idle keep-alive connection; retry once on a fresh one.
+            connection = self.__new_connection()
+            response, body = self.__send(connection, path)
+
+        if response.status != 200:
+            connection.close()
+            raise http.client.HTTPException('OMDb responded with HTTP {}'.format(response.status))
+        self.__release(connection, response)
+        return body
+
+    def __send(self, connection, path):
+        # The body is read here too, so that a failure anywhere in the exchange, including a reset or timeout part way
+        # through the body, closes the connection rather than leaving it to go back to the pool.
+        try:
+            connection.request('GET', path, headers={'Connection': 'keep-alive', 'Accept': 'application/json'})
+            response = connection.getresponse()
+            return response, response.read()
+        except BaseException:
+            connection.close()
+            raise
+
+    def __acquire(self):
+        try:
+            return self.__idle_connections.get_nowait(), True
+        except queue.Empty:
+            return self.__new_connection(), False
+
+    def __new_connection(self):
+        with self.__lock:
+            self.__connections_opened += 1
+        return self.__connection_class(self.__host, timeout=self.__timeout)
+
+    def __release(self, connection, response):
+        if response.will_close:
+            connection.close()
+            return
+        try:
+            self.__idle_connections.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def __record(self, seconds, failed):
+        self.__latency.observe(seconds)
+        with self.__lock:
+            self.__requests += 1
+            if failed:
+                self.__failures += 1
+        if failed:
+            self.__breaker.record_failure()
+        else:
+            self.__breaker.record_success()
+
+    def close(self):
+        while True:
+            try:
+                self.__idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+    @property
+    def stats(self):
+        with self.__lock:
+            return {
+                'requests': self.__requests,
+                'failures': self.__failures,
+                'rejected': self.__rejected,
+                'connections_opened': self.__connections_opened,
+                'idle_connections': self.__idle_connections.qsize(),
+                'circuit': self.__breaker.state,
+                'latency_seconds': self.__latency.stats,
+            }
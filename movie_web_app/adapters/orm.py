@@ -1,7 +1,8 @@
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, Date, DateTime,
-    ForeignKey
+    Table, MetaData, Column, Integer, Float, String, Date, DateTime,
+    ForeignKey, DDL, event, inspect
 )
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.orm import mapper, relationship
 
 from movie_web_app.domain import model
@@ -18,8 +19,8 @@ users = Table(
 reviews = Table(
     'reviews', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('user_id', ForeignKey('users.id')),
-    Column('movie_id', ForeignKey('movies.rank')),
+    Column('user_id', ForeignKey('users.id'), index=True),
+    Column('movie_id', ForeignKey('movies.rank'), index=True),
     Column('review', String(1024), nullable=False),
     Column('rating', Integer, nullable=False),
     Column('timestamp', DateTime, nullable=False)
@@ -28,9 +29,14 @@ reviews = Table(
 movies = Table(
     'movies', metadata,
     Column('rank', Integer, primary_key=True), #autoincrement=True),
-    Column('release_year', Integer, nullable=False),
+    Column('release_year', Integer, nullable=False, index=True),
     Column('title', String(255), nullable=False),
     Column('description', String(1024), nullable=False),
+    Column('runtime', Integer, index=True),
+    Column('rating', Float, index=True),
+    Column('votes', Integer, nullable=False, server_default='0', index=True),
+    Column('revenue', Float, index=True),
+    Column('metascore', Integer, index=True),
     #Column('director', String(255), nullable=False),
     #Column('actor', String(255), nullable=False),
     #Column('genre', String(255), nullable=False)
@@ -51,43 +57,161 @@ movie_years = Table(
 directors = Table(
     'directors', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('name', String(64), nullable=False)
+    Column('name', String(64), nullable=False, index=True)
 )
 
 movie_directors = Table(
     'movie_director', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('movie_id', ForeignKey('movies.rank')),
-    Column('director_id', ForeignKey('directors.id'))
+    Column('movie_id', ForeignKey('movies.rank'), index=True),
+    Column('director_id', ForeignKey('directors.id'), index=True)
 )
 
 actors = Table(
     'actors', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('name', String(64), nullable=False)
+    Column('name', String(64), nullable=False, index=True)
 )
 
 movie_actors = Table(
     'movie_actors', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('movie_id', ForeignKey('movies.rank')),
-    Column('actor_id', ForeignKey('actors.id'))
+    Column('movie_id', ForeignKey('movies.rank'), index=True),
+    Column('actor_id', ForeignKey('actors.id'), index=True)
 )
 
 genres = Table(
     'genres', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('name', String(64), nullable=False)
+    Column('name', String(64), nullable=False, index=True)
 )
 
 movie_genres = Table(
     'movie_genres', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('movie_id', ForeignKey('movies.rank')),
-    Column('genre_id', ForeignKey('genres.id'))
+    Column('movie_id', ForeignKey('movies.rank'), index=True),
+    Column('genre_id', ForeignKey('genres.id'), index=True)
+)
+
+versions = Table(
+    'versions', metadata,
+    Column('name', String(64), primary_key=True),
+    Column('value', Integer, nullable=False)
 )
 
 
+# Full-text index over movies and the names of their people and genres, kept in sync by triggers so that searches run
+# entirely inside SQLite. The rowid of an indexed movie is its rank.
+movies_fts_ddl = {
+    movies: [
+        'CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5('
+        'title, actors, director, genres, description, release_year)',
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN '
+        'INSERT INTO movies_fts (rowid, title, actors, director, genres, description, release_year) '
+        "VALUES (new.rank, new.title, '', '', '', new.description, new.release_year); END",
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, description, release_year ON movies '
+        'BEGIN UPDATE movies_fts SET title = new.title, description = new.description, '
+        'release_year = new.release_year WHERE rowid = new.rank; END',
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN '
+        'DELETE FROM movies_fts WHERE rowid = old.rank; END',
+    ],
+    movie_actors: [
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_actor AFTER INSERT ON movie_actors BEGIN '
+        "UPDATE movies_fts SET actors = actors || ' ' || (SELECT name FROM actors WHERE id = new.actor_id) "
+        'WHERE rowid = new.movie_id; END',
+    ],
+    movie_directors: [
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_director AFTER INSERT ON movie_director BEGIN '
+        "UPDATE movies_fts SET director = director || ' ' || "
+        '(SELECT name FROM directors WHERE id = new.director_id) WHERE rowid = new.movie_id; END',
+    ],
+    movie_genres: [
+        'CREATE TRIGGER IF NOT EXISTS movies_fts_genre AFTER INSERT ON movie_genres BEGIN '
+        "UPDATE movies_fts SET genres = genres || ' ' || (SELECT name FROM genres WHERE id = new.genre_id) "
+        'WHERE rowid = new.movie_id; END',
+    ],
+}
+
+movies_fts_rebuild = (
+    'INSERT INTO movies_fts (rowid, title, actors, director, genres, description, release_year) '
+    'SELECT rank, title, '
+    "COALESCE((SELECT group_concat(name, ' ') FROM movie_actors JOIN actors ON actors.id = actor_id "
+    "WHERE movie_id = rank), ''), "
+    "COALESCE((SELECT group_concat(name, ' ') FROM movie_director JOIN directors ON directors.id = director_id "
+    "WHERE movie_id = rank), ''), "
+    "COALESCE((SELECT group_concat(name, ' ') FROM movie_genres JOIN genres ON genres.id = genre_id "
+    "WHERE movie_id = rank), ''), "
+    'description, release_year FROM movies'
+)
+
+event.listen(movies, 'before_drop', DDL('DROP TABLE IF EXISTS movies_fts').execute_if(dialect='sqlite'))
+
+
+# Versions of the catalog and of the reviews, which caches of derived data compare against. Triggers bump them in the
+# same transaction as every change, so all processes sharing the database see the same versions.
+versioned_tables = {
+    'catalog': [movies, release_years, movie_years, directors, movie_directors, actors, movie_actors, genres,
+                movie_genres],
+    'reviews': [reviews],
+}
+
+versions_ddl = dict()
+for version, tables in versioned_tables.items():
+    for table in tables:
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            versions_ddl.setdefault(table, list()).append(
+                'CREATE TRIGGER IF NOT EXISTS {table}_{name}_version AFTER {operation} ON {table} BEGIN '
+                "INSERT INTO versions (name, value) VALUES ('{version}', 1) "
+                'ON CONFLICT (name) DO UPDATE SET value = value + 1; END'.format(
+                    table=table.name, name=operation.lower(), operation=operation, version=version))
+
+# SQLite-only statements run after each table is created. They are all idempotent, so upgrade_schema() can run them
+# again on a database created before they existed.
+sqlite_ddl = dict()
+for table_ddl in (movies_fts_ddl, versions_ddl):
+    for table, statements in table_ddl.items():
+        sqlite_ddl.setdefault(table, list()).extend(statements)
+
+for table, statements in sqlite_ddl.items():
+    for statement in statements:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def upgrade_schema(engine):
+    """ Brings a database created by an earlier version of the application up to the current schema.
+
+    Missing tables, columns, indexes and triggers are created, and the full-text index is built from the movies
+    already stored if it did not exist yet. Columns added to existing tables are empty (NULL, or their default) until
+    the database is populated again.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            columns = set(column['name'] for column in inspector.get_columns(table.name))
+            for column in table.columns:
+                if column.name not in columns:
+                    connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                        table.name, CreateColumn(column).compile(dialect=engine.dialect)))
+
+            indexes = set(index['name'] for index in inspector.get_indexes(table.name))
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+
+            if engine.dialect.name == 'sqlite':
+                for statement in sqlite_ddl.get(table, ()):
+                    connection.execute(statement)
+
+        if engine.dialect.name == 'sqlite' and 'movies' in existing_tables and 'movies_fts' not in existing_tables:
+            connection.execute(movies_fts_rebuild)
+
+
 def map_model_to_tables():
     mapper(model.User, users, properties={
         '__user_name': users.c.username,
@@ -0,0 +1,242 @@
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from movie_web_app.adapters.omdb import OmdbException
+from movie_web_app.utilities.lru_cache import LRUCache
+
+cache_instance = None
+
+# Poster artwork practically never changes, so resolved posters are kept for a long time. Titles OMDb does not know
+# are remembered for a shorter period, and lookups that failed outright (network errors, timeouts) only briefly.
+POSTER_TTL = 30 * 24 * 60 * 60
+NOT_FOUND_TTL = 24 * 60 * 60
+ERROR_TTL = 60
+
+# How long a page render waits for outstanding poster lookups before falling back to the placeholder image.
+DEFAULT_DEADLINE = 1.0
+
+# Marker stored in both cache tiers for titles that OMDb has no poster for.
+NOT_FOUND = ''
+
+
+def close_instance():
+    """ Closes cache_instance, if there is one, and forgets it. """
+    global cache_instance
+    if cache_instance is not None:
+        cache_instance.close()
+        cache_instance = None
+
+
+class PosterStore:
+    """ SQLite-backed poster table that survives application restarts. """
+
+    def __init__(self, database_path: str):
+        self.__connection = sqlite3.connect(database_path, check_same_thread=False)
+        self.__lock = threading.Lock()
+        with self.__lock:
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS posters ('
+                                      'title TEXT PRIMARY KEY, poster TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self.__connection.commit()
+
+    def get(self, title: str):
+        """ Returns (poster, expires_at) for title, or None if the title has no unexpired entry. """
+        with self.__lock:
+            row = self.__connection.execute('SELECT poster, expires_at FROM posters WHERE title = ?',
+                                            (title,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row
+
+    def put(self, title: str, poster: str, ttl: float):
+        with self.__lock:
+            self.__connection.execute('INSERT OR REPLACE INTO posters (title, poster, expires_at) VALUES (?, ?, ?)',
+                                      (title, poster, time.time() + ttl))
+            self.__connection.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+class PosterCache:
+    """ Two-tier poster cache: an in-process LRU in front of an optional persistent PosterStore.
+
+    The fetcher is called with a movie title on a miss in both tiers, and must return the poster URL, return None
+    for titles it has no poster for, or raise OmdbException. Batch lookups run the fetcher on a bounded
+    thread pool, and a title is never fetched by more than one thread at a time.
+    """
+
+    def __init__(self, fetcher, store: PosterStore = None, max_entries: int = 2048, max_workers: int = 8,
+                 deadline: float = DEFAULT_DEADLINE):
+        self.__fetcher = fetcher
+        self.__store = store
+        self.__memory = LRUCache(max_entries)
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='poster-fetch')
+        self.__deadline = deadline
+        self.__pending = dict()
+        # Re-entrant, as a done-callback runs straight away in the submitting thread if the fetch already finished.
+        self.__pending_lock = threading.RLock()
+        self.__lock = threading.Lock()
+        self.__memory_hits = 0
+        self.__disk_hits = 0
+        self.__negative_hits = 0
+        self.__misses = 0
+        self.__fetch_errors = 0
+        self.__fetch_seconds = 0.0
+        self.__max_fetch_seconds = 0.0
+
+    def get_poster(self, title: str):
+        """ Returns the poster URL for title, or None if there is no poster (or it can't be looked up right now). """
+        poster = self.__lookup(title)
+        if poster is not None:
+            return poster or None
+
+        return self.__fetch(title)
+
+    def load_poster(self, title: str):
+        """ Returns the poster URL for title, or None if OMDb has no poster for it, fetching it if not yet cached.
+
+        Unlike get_poster, a failed lookup is neither cached nor hidden: OmdbException is raised to the caller.
+        """
+        poster = self.__lookup(title)
+        if poster is not None:
+            return poster or None
+
+        return self.__fetch_and_remember(title)
+
+    def get_posters(self, titles, deadline: float = None):
+        """ Returns a dict mapping each of titles to its poster URL (or None).
+
+        Titles missing from both cache tiers are fetched concurrently. Lookups still outstanding once deadline seconds
+        have passed map to None, but carry on in the background so that their results are cached for later requests.
+        """
+        if deadline is None:
+            deadline = self.__deadline
+
+        posters = dict()
+        pending = dict()
+        for title in titles:
+            poster = self.__lookup(title)
+            if poster is None:
+                pending[title] = self.__fetch_in_background(title)
+            else:
+                posters[title] = poster or None
+
+        if len(pending) > 0:
+            wait(pending.values(), timeout=deadline)
+            for title, future in pending.items():
+                # A lookup cancelled by close() is treated like one that missed the deadline.
+                posters[title] = future.result() if future.done() and not future.cancelled() else None
+
+        return posters
+
+    def __lookup(self, title: str):
+        # Returns the cached poster, NOT_FOUND for a cached miss, or None if neither tier knows about the title.
+        poster = self.__memory.get(title)
+        if poster is not None:
+            self.__count_hit(poster, disk=False)
+            return poster
+
+        if self.__store is not None:
+            entry = self.__store.get(title)
+            if entry is not None:
+                poster, expires_at = entry
+                self.__memory.put(title, poster, ttl=expires_at - time.time())
+                self.__count_hit(poster, disk=True)
+                return poster
+
+        return None
+
+    def __fetch_in_background(self, title: str):
+        with self.__pending_lock:
+            future = self.__pending.get(title)
+            if future is None:
+                future = self.__executor.submit(self.__fetch, title)
+                self.__pending[title] = future
+                future.add_done_callback(lambda done: self.__forget_pending(title))
+        return future
+
+    def __forget_pending(self, title: str):
+        with self.__pending_lock:
+            self.__pending.pop(title, None)
+
+    def __fetch(self, title: str):
+        try:
+            return self.__fetch_and_remember(title)
+        except OmdbException:
+            # Don't persist transient failures; just stop every request from retrying immediately.
+            self.__memory.put(title, NOT_FOUND, ttl=ERROR_TTL)
+            return None
+
+    def __fetch_and_remember(self, title: str):
+        started = time.perf_counter()
+        try:
+            poster = self.__fetcher(title)
+        except OmdbException:
+            self.__record_fetch(time.perf_counter() - started, failed=True)
+            raise
+
+        self.__record_fetch(time.perf_counter() - started, failed=False)
+        if poster is None:
+            self.__remember(title, NOT_FOUND, NOT_FOUND_TTL)
+        else:
+            self.__remember(title, poster, POSTER_TTL)
+        return poster
+
+    def __remember(self, title, poster, ttl):
+        self.__memory.put(title, poster, ttl=ttl)
+        if self.__store is not None:
+            self.__store.put(title, poster, ttl)
+
+    def __count_hit(self, poster, disk):
+        with self.__lock:
+            if disk:
+                self.__disk_hits += 1
+            else:
+                self.__memory_hits += 1
+            if poster == NOT_FOUND:
+                self.__negative_hits += 1
+
+    def __record_fetch(self, seconds, failed):
+        with self.__lock:
+            self.__misses += 1
+            self.__fetch_seconds += seconds
+            self.__max_fetch_seconds = max(self.__max_fetch_seconds, seconds)
+            if failed:
+                self.__fetch_errors += 1
+
+    @property
+    def persistent(self):
+        """ True if resolved posters are kept in a PosterStore, and so outlive this process. """
+        return self.__store is not None
+
+    def close(self):
+        """ Stops the fetch threads, once the lookups already running have finished, and closes the store.
+
+        Lookups still queued are cancelled rather than run.
+        """
+        # Cancelled here, as shutdown's cancel_futures argument needs Python 3.9.
+        with self.__pending_lock:
+            futures = list(self.__pending.values())
+        for future in futures:
+            future.cancel()
+        self.__executor.shutdown(wait=True)
+        if self.__store is not None:
+            self.__store.close()
+
+    @property
+    def stats(self):
+        with self.__lock:
+            return {
+                'memory_hits': self.__memory_hits,
+                'disk_hits': self.__disk_hits,
+                'negative_hits': self.__negative_hits,
+                'misses': self.__misses,
+                'fetch_errors': self.__fetch_errors,
+                'mean_fetch_seconds': self.__fetch_seconds / self.__misses if self.__misses else 0.0,
+                'max_fetch_seconds': self.__max_fetch_seconds,
+                'memory_entries': len(self.__memory),
+            }
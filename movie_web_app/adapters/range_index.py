@@ -0,0 +1,79 @@
+from bisect import bisect_left, bisect_right, insort
+
+# Sort keys below and above those of every movie with a given value, as ranks are never negative.
+LOWEST_RANK = -1
+HIGHEST_RANK = float('inf')
+
+
+class RangeIndex:
+    """ Index of movies by a numeric attribute, such as runtime or rating, for range queries and sorted listings.
+
+    Entries are (value, rank) pairs in a list sorted by value, then rank, so the movies with values in a range form a
+    contiguous slice of it, found with two binary searches, and the list is itself the order of the movies by value,
+    from which a page of a listing is sliced. Movies without a value (such as those with no known revenue) are left out
+    of the index.
+    """
+
+    def __init__(self):
+        self.__entries = list()
+        self.__values = dict()
+
+    def add(self, value, rank: int):
+        previous = self.__values.pop(rank, None)
+        if previous is not None:
+            del self.__entries[bisect_left(self.__entries, (previous, rank))]
+        if value is None:
+            return
+
+        self.__values[rank] = value
+        if len(self.__entries) == 0 or self.__entries[-1] < (value, rank):
+            self.__entries.append((value, rank))
+        else:
+            insort(self.__entries, (value, rank))
+
+    def value(self, rank: int):
+        """ Returns the value of the movie of rank, or None if it has none. """
+        return self.__values.get(rank)
+
+    def count(self, minimum=None, maximum=None):
+        """ Returns the number of movies with values from minimum to maximum inclusive. """
+        start, end = self.__bounds(minimum, maximum)
+        return max(end - start, 0)
+
+    def ranks(self, minimum=None, maximum=None):
+        """ Returns the ranks of the movies with values from minimum to maximum inclusive, in order of value.
+
+        A bound of None leaves that end of the range open.
+        """
+        start, end = self.__bounds(minimum, maximum)
+        return [rank for value, rank in self.__entries[start:end]]
+
+    def page(self, offset: int = 0, limit: int = None, descending: bool = False):
+        """ Returns the ranks of the movies from offset on in order of value, at most limit of them.
+
+        Movies with equal values are listed in order of rank, in descending order as well as ascending.
+        """
+        offset = max(0, min(offset, len(self.__entries)))
+        end = len(self.__entries) if limit is None else min(offset + limit, len(self.__entries))
+        if not descending:
+            return [rank for value, rank in self.__entries[offset:end]]
+
+        # Runs of equal values are taken from the end of the list backwards, each of them in ascending order of rank.
+        ranks = list()
+        position = offset
+        while position < end:
+            value = self.__entries[len(self.__entries) - 1 - position][0]
+            run_start, run_end = self.__bounds(value, value)
+            start = run_start + position - (len(self.__entries) - run_end)
+            stop = min(run_end, start + end - position)
+            ranks.extend(rank for value, rank in self.__entries[start:stop])
+            position += stop - start
+        return ranks
+
+    def __bounds(self, minimum, maximum):
+        start = 0 if minimum is None else bisect_left(self.__entries, (minimum, LOWEST_RANK))
+        end = len(self.__entries) if maximum is None else bisect_right(self.__entries, (maximum, HIGHEST_RANK))
+        return start, end
+
+    def __len__(self):
+        return len(self.__entries)
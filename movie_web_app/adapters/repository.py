@@ -5,6 +5,9 @@ from movie_web_app.domain.model import Movie, Actor, Genre, Director, User, Revi
 
 repo_instance = None
 
+# Numeric attributes that movies can be filtered on by range, sorted on and summarised.
+RANGE_ATTRIBUTES = ('release_year', 'runtime', 'rating', 'votes', 'revenue', 'metascore')
+
 
 class RepositoryException(Exception):
 
@@ -59,6 +62,19 @@ class AbstractRepository(abc.ABC):
     def all_movies(self):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_catalog_version(self):
+        """ Returns a counter that changes whenever movies are added to the catalog.
+
+        Data derived from the catalog (year and genre lists, navigation URLs) can be cached for as long as the
+        catalog version stays the same. Adding reviews or users does not change the catalog version."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_review_version(self):
+        """ Returns a counter that changes whenever a review is added. """
+        raise NotImplementedError
+
     #@abc.abstractmethod
     ##def add_movie_details(self, movie, details):
         raise NotImplementedError
@@ -92,6 +108,19 @@ class AbstractRepository(abc.ABC):
     def get_genre_list(self):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_years_in_range(self, first_year=None, last_year=None):
+        """ Returns the release years from first_year to last_year inclusive, in ascending order.
+
+        A bound of None leaves that end of the range open.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movies_with_years_in_range(self, first_year=None, last_year=None):
+        """ Returns the ranks, in ascending order, of the Movies released from first_year to last_year inclusive. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_movie_with_given_year(self, year):
         """Return the Movies with a given year from the repository.
@@ -99,6 +128,35 @@ class AbstractRepository(abc.ABC):
         If there is no Movie with the given year, this method returns None."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_movies_in_ranges(self, ranges: dict):
+        """ Returns the ranks, in ascending order, of the Movies with attributes in every one of ranges.
+
+        ranges maps attributes in RANGE_ATTRIBUTES to (minimum, maximum) tuples of inclusive bounds, either of which
+        may be None to leave that end of the range open. Movies without a value for an attribute (such as those with
+        no known revenue) are not in any range of it. An unknown attribute raises RepositoryException.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movies_sorted_by(self, attribute: str, offset: int = 0, limit: int = None, descending: bool = True):
+        """ Returns the ranks of the Movies in order of attribute, from offset on and at most limit of them, and the
+        number of Movies in the order.
+
+        attribute is one of RANGE_ATTRIBUTES. Movies without a value of it are left out of the order, and Movies with
+        equal values are ordered by rank, whether descending or not.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_movie_statistics(self, attribute: str, movie_ranks=None):
+        """ Returns the number of Movies with a value of attribute, and its minimum, maximum and mean, as a dict.
+
+        attribute is one of RANGE_ATTRIBUTES. Only the Movies of movie_ranks are included, or every Movie if
+        movie_ranks is None. The minimum, maximum and mean are None when no Movie has a value.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_movie_with_given_actor(self, actor):
         raise NotImplementedError
@@ -111,6 +169,35 @@ class AbstractRepository(abc.ABC):
     def get_movie_with_given_genre(self, genre):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def filter_movies(self, release_year=None, genre=None, director=None, actor=None, facet_limit: int = 10):
+        """ Returns the ranks, in ascending order, of the Movies matching all the given filters, and facet counts.
+
+        Facet counts are given for each of 'release_year', 'genre', 'director' and 'actor' that isn't filtered on, as
+        a list of up to facet_limit (value, number of matching Movies) tuples, most frequent first."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_movies(self, query: str, limit: int = None, offset: int = 0):
+        """ Returns the ranks of the Movies matching every word of query, most relevant first, and their number.
+
+        A word matches a Movie if it occurs in its title, description, release year, director, actors or genres.
+        The offset most relevant Movies are skipped, and if limit is given, at most limit ranks are returned."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search_similar_movies(self, query: str, limit: int = None, offset: int = 0):
+        """ Like search_movies, but for Movies with a title or a director or actor name spelled similarly to query."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_completions(self, prefix: str, limit: int = 10):
+        """ Returns up to limit titles and director and actor names with a word starting with prefix.
+
+        Completions are (label, kind, rank) tuples, most popular first; kind is 'title', 'director' or 'actor', and rank
+        is the rank of the Movie for titles and None for names."""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_review(self, review: Review):
         """Adds a Review to the repository."""
@@ -124,6 +211,16 @@ class AbstractRepository(abc.ABC):
         """Return the review of a Movie stored in the repository."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_reviews_for_movie(self, movie_rank: int):
+        """ Returns the Reviews of the Movie of rank movie_rank, in the order they were added. """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reviews_for_user(self, username):
+        """ Returns the Reviews written by the User named username, in the order they were added. """
+        raise NotImplementedError
+
     #@abc.abstractmethod
     #def get_user_watched_movies(self, user):
     #    raise NotImplementedError
@@ -0,0 +1,342 @@
+import heapq
+import math
+import re
+import threading
+
+from bisect import bisect_left
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Relative weight of a match in each field, in the order the fields are stored in postings.
+FIELD_BOOSTS = {
+    'title': 3.0,
+    'actors': 2.0,
+    'director': 2.0,
+    'genres': 1.0,
+    'description': 1.0,
+    'release_year': 1.0,
+}
+FIELDS = list(FIELD_BOOSTS)
+
+# BM25 parameters: K1 controls how quickly repeated matches saturate, B how strongly long fields are penalised.
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str):
+    """ Splits text into lower case word tokens. """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def field_text(value):
+    # Movies loaded by memory_repository hold people and genres as plain strings, those built by MovieFileCSVReader
+    # hold Actor, Director and Genre objects.
+    for attribute in ('actor_full_name', 'director_full_name', 'genre_name'):
+        if hasattr(value, attribute):
+            return getattr(value, attribute) or ''
+    return '' if value is None else str(value)
+
+
+def movie_fields(movie):
+    """ Returns the searchable text of a movie, as a dict from field name to text. """
+    return {
+        'title': movie.title,
+        'actors': ' '.join(field_text(actor) for actor in movie.actors),
+        'director': field_text(movie.director),
+        'genres': ' '.join(field_text(genre) for genre in movie.genres),
+        'description': movie.description,
+        'release_year': field_text(movie.release_year),
+    }
+
+
+def intersect(shorter, longer):
+    """ Intersects two sorted lists of ranks, looking up each rank of the shorter list in the longer one. """
+    result = list()
+    low = 0
+    for rank in shorter:
+        low = bisect_left(longer, rank, low)
+        if low == len(longer):
+            break
+        if longer[low] == rank:
+            result.append(rank)
+    return result
+
+
+class SearchIndex:
+    """ Inverted index from normalized tokens to the movies containing them, with BM25F relevance ranking.
+
+    Each token has a sorted list of the ranks of the movies containing it, for intersecting, and the frequency of the
+    token in each field of those movies, for scoring. Movies are indexed as they are added, so a search only touches
+    the posting lists of the words searched for.
+    """
+
+    def __init__(self):
+        self.__postings = dict()
+        self.__frequencies = dict()
+        self.__field_lengths = dict()
+        self.__total_field_lengths = [0] * len(FIELDS)
+
+    def add_movie(self, movie):
+        if movie.rank in self.__field_lengths:
+            return
+
+        lengths = list()
+        frequencies = dict()
+        for field, text in enumerate(movie_fields(movie).values()):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                field_frequencies = frequencies.setdefault(token, [0] * len(FIELDS))
+                field_frequencies[field] += 1
+
+        self.__field_lengths[movie.rank] = lengths
+        for field, length in enumerate(lengths):
+            self.__total_field_lengths[field] += length
+
+        for token, field_frequencies in frequencies.items():
+            postings = self.__postings.setdefault(token, list())
+            if len(postings) == 0 or postings[-1] < movie.rank:
+                # Movies are usually added in rank order.
+                postings.append(movie.rank)
+            else:
+                postings.insert(bisect_left(postings, movie.rank), movie.rank)
+            self.__frequencies.setdefault(token, dict())[movie.rank] = tuple(field_frequencies)
+
+    def match(self, tokens):
+        """ Returns the ranks, in ascending order, of the movies containing every one of tokens. """
+        posting_lists = list()
+        for token in tokens:
+            postings = self.__postings.get(token)
+            if postings is None:
+                return list()
+            posting_lists.append(postings)
+        if len(posting_lists) == 0:
+            return list()
+
+        # Start from the shortest list, so that each intersection works on as few ranks as possible.
+        posting_lists.sort(key=len)
+        result = posting_lists[0]
+        for postings in posting_lists[1:]:
+            result = intersect(result, postings)
+            if len(result) == 0:
+                break
+        return list(result)
+
+    def search(self, query: str, limit: int = None):
+        """ Returns the ranks of the movies containing every word of query, best match first, and their number.
+
+        Only the best limit movies are returned, selected with a heap rather than by sorting every match.
+        """
+        tokens = list(set(tokenize(query)))
+        matches = self.match(tokens)
+        if len(matches) == 0:
+            return list(), 0
+        if limit is None:
+            limit = len(matches)
+
+        number_of_movies = len(self.__field_lengths)
+        average_lengths = [total / number_of_movies for total in self.__total_field_lengths]
+        weights = [self.__idf(token, number_of_movies) for token in tokens]
+
+        def score(rank):
+            lengths = self.__field_lengths[rank]
+            total = 0.0
+            for token, weight in zip(tokens, weights):
+                field_frequencies = self.__frequencies[token][rank]
+                frequency = 0.0
+                for field, field_frequency in enumerate(field_frequencies):
+                    if field_frequency:
+                        normalization = 1 - B + B * lengths[field] / average_lengths[field]
+                        frequency += FIELD_BOOSTS[FIELDS[field]] * field_frequency / normalization
+                total += weight * frequency / (K1 + frequency)
+            # Equally relevant movies are listed in rank order.
+            return total, -rank
+
+        return heapq.nlargest(limit, matches, key=score), len(matches)
+
+    def __idf(self, token, number_of_movies):
+        document_frequency = len(self.__postings[token])
+        return math.log(1 + (number_of_movies - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def __len__(self):
+        return len(self.__postings)
+
+
+def trigrams(text: str):
+    """ Returns the set of trigrams of the words of text, each word padded as in PostgreSQL's pg_trgm. """
+    result = set()
+    for token in tokenize(text):
+        padded = '  {} '.format(token)
+        for start in range(len(padded) - 2):
+            result.add(padded[start:start + 3])
+    return result
+
+
+class TrigramIndex:
+    """ Index of titles and names by their trigrams, for finding the movies of misspelled titles and names.
+
+    Similarity is the Jaccard coefficient of the trigram sets of the query and a name. Candidates are only gathered
+    from the postings of the query's rarest trigrams: a name sharing none of them shares too few trigrams with the
+    query to reach the similarity threshold, so frequent trigrams never have to be scanned.
+    """
+
+    def __init__(self, threshold: float = 0.3):
+        self.__threshold = threshold
+        self.__names = dict()
+        self.__name_trigrams = list()
+        self.__name_ranks = list()
+        self.__postings = dict()
+
+    def add(self, text: str, rank: int):
+        name = ' '.join(tokenize(text))
+        if name == '':
+            return
+
+        name_id = self.__names.get(name)
+        if name_id is None:
+            name_id = self.__names[name] = len(self.__name_trigrams)
+            name_trigrams = trigrams(name)
+            self.__name_trigrams.append(name_trigrams)
+            self.__name_ranks.append(list())
+            for trigram in name_trigrams:
+                self.__postings.setdefault(trigram, list()).append(name_id)
+
+        if rank not in self.__name_ranks[name_id]:
+            self.__name_ranks[name_id].append(rank)
+
+    def add_movie(self, movie):
+        self.add(movie.title, movie.rank)
+        self.add(field_text(movie.director), movie.rank)
+        for actor in movie.actors:
+            self.add(field_text(actor), movie.rank)
+
+    def search(self, query: str):
+        """ Returns the ranks of the movies with a title or name similar to query, most similar first. """
+        query_trigrams = trigrams(query)
+        if len(query_trigrams) == 0:
+            return list()
+
+        # A name with a similarity of at least the threshold shares at least this many trigrams with the query.
+        required = max(1, math.ceil(self.__threshold * len(query_trigrams)))
+        rarest = sorted(query_trigrams, key=lambda trigram: len(self.__postings.get(trigram, ())))
+        candidates = set()
+        for trigram in rarest[:len(query_trigrams) - required + 1]:
+            candidates.update(self.__postings.get(trigram, ()))
+
+        similarities = dict()
+        for name_id in candidates:
+            name_trigrams = self.__name_trigrams[name_id]
+            shared = len(query_trigrams & name_trigrams)
+            similarity = shared / (len(query_trigrams) + len(name_trigrams) - shared)
+            if similarity < self.__threshold:
+                continue
+            for rank in self.__name_ranks[name_id]:
+                if similarity > similarities.get(rank, 0.0):
+                    similarities[rank] = similarity
+
+        return sorted(similarities, key=lambda rank: (-similarities[rank], rank))
+
+    def __len__(self):
+        return len(self.__names)
+
+
+class PrefixIndex:
+    """ Sorted array of normalized titles and names, for completing what a user has typed so far.
+
+    Every title and name is stored once for each of its words, from that word to the end, so that typing any word of
+    it finds it. The entries starting with a prefix form a contiguous range of the array, found with two binary
+    searches; the most popular of them are picked with a heap, and remembered until the index next changes. Entries
+    are added to the array in one sort when completions are next asked for, rather than inserted one at a time.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.__entries = list()
+        self.__pending_entries = list()
+        self.__changed = False
+        self.__lock = threading.Lock()
+        self.__names = dict()
+        self.__labels = list()
+        self.__kinds = list()
+        self.__name_ranks = list()
+        self.__popularity = list()
+        self.__cache_size = cache_size
+        self.__completions = dict()
+
+    def add(self, label: str, kind: str, rank: int, popularity: int = 0):
+        tokens = tokenize(label)
+        if len(tokens) == 0:
+            return
+
+        name = (kind, ' '.join(tokens))
+        # Movies may be added while requests complete names, so adding is serialised with merging pending entries.
+        with self.__lock:
+            name_id = self.__names.get(name)
+            if name_id is None:
+                name_id = self.__names[name] = len(self.__labels)
+                self.__labels.append(label.strip())
+                self.__kinds.append(kind)
+                self.__name_ranks.append(list())
+                self.__popularity.append(0)
+                for start in range(len(tokens)):
+                    self.__pending_entries.append((' '.join(tokens[start:]), name_id))
+                self.__changed = True
+
+            if rank not in self.__name_ranks[name_id]:
+                # A name is as popular as all its movies together.
+                self.__name_ranks[name_id].append(rank)
+                self.__popularity[name_id] += popularity
+                self.__changed = True
+
+    def add_movie(self, movie):
+        self.add(movie.title, 'title', movie.rank, movie.votes)
+        self.add(field_text(movie.director), 'director', movie.rank, movie.votes)
+        for actor in movie.actors:
+            self.add(field_text(actor), 'actor', movie.rank, movie.votes)
+
+    def complete(self, prefix: str, limit: int = 10):
+        """ Returns the most popular titles and names with a word starting with prefix.
+
+        Each completion is a (label, kind, rank) tuple, where kind is 'title', 'director' or 'actor', and rank is the
+        rank of the movie for titles and None for names.
+        """
+        key = ' '.join(tokenize(prefix))
+        if key == '':
+            return list()
+
+        if self.__changed:
+            self.__update()
+
+        completions = self.__completions.get((key, limit))
+        if completions is not None:
+            return completions
+
+        start = bisect_left(self.__entries, (key,))
+        end = bisect_left(self.__entries, (key + '\uffff',), start)
+        name_ids = set(name_id for entry_key, name_id in self.__entries[start:end])
+        best = heapq.nlargest(limit, name_ids, key=lambda name_id: (self.__popularity[name_id], -name_id))
+
+        completions = list()
+        for name_id in best:
+            rank = self.__name_ranks[name_id][0] if self.__kinds[name_id] == 'title' else None
+            completions.append((self.__labels[name_id], self.__kinds[name_id], rank))
+
+        if len(self.__completions) >= self.__cache_size:
+            self.__completions.clear()
+        self.__completions[(key, limit)] = completions
+        return completions
+
+    def __update(self):
+        # Sorting once is O(n log n) for a whole catalog, where inserting each entry in place would be O(n^2). Sorting
+        # is fast too when only a few entries were added, as it merges them into the already sorted run.
+        with self.__lock:
+            if not self.__changed:
+                return
+            entries = self.__entries + self.__pending_entries
+            entries.sort()
+            self.__entries = entries
+            self.__pending_entries = list()
+            self.__completions = dict()
+            self.__changed = False
+
+    def __len__(self):
+        return len(self.__entries) + len(self.__pending_entries)
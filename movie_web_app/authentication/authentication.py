@@ -8,7 +8,6 @@ from password_validator import PasswordValidator
 
 from functools import wraps
 
-import movie_web_app.utilities.utilities as utilities
 import movie_web_app.authentication.services as services
 import movie_web_app.adapters.repository as repo
 
@@ -40,10 +39,6 @@ def register():
         form=form,
         username_error_message=username_not_unique,
         handler_url=url_for('authentication_bp.register'),
-        selected_movies=utilities.get_selected_movies(),
-        rank_urls=utilities.get_rank_and_url(),
-        genre_urls=utilities.get_genres_and_urls(),
-        year_urls=utilities.get_years_and_urls(),
     )
 
 
@@ -82,10 +77,6 @@ def login():
         username_error_message=username_not_recognised,
         password_error_message=password_does_not_match_username,
         form=form,
-        selected_movies=utilities.get_selected_movies(),
-        rank_urls=utilities.get_rank_and_url(),
-        genre_urls=utilities.get_genres_and_urls(),
-        year_urls=utilities.get_years_and_urls(),
     )
 
 
@@ -8,11 +8,7 @@ home_blueprint = Blueprint(
 
 
 @home_blueprint.route('/', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
 def home():
-    return render_template(
-        'home/home.html',
-        selected_movies=utilities.get_selected_movies(),
-        year_urls=utilities.get_years_and_urls(),
-        genre_urls=utilities.get_genres_and_urls(),
-        rank_urls=utilities.get_rank_and_url(),
-    )
\ No newline at end of file
+    return render_template('home/home.html')
\ No newline at end of file
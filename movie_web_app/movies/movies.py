@@ -1,7 +1,7 @@
 from datetime import date
 
 from flask import Blueprint
-from flask import request, render_template, redirect, url_for, session
+from flask import request, render_template, redirect, url_for, session, jsonify
 
 from better_profanity import profanity
 from flask_wtf import FlaskForm
@@ -14,16 +14,14 @@ import movie_web_app.movies.services as services
 
 from movie_web_app.authentication.authentication import login_required
 
-from urllib.request import urlopen
-import urllib.parse
-import ast
-
 # Configure Blueprint.
 movies_blueprint = Blueprint(
     'movies_bp', __name__)
 
 
 @movies_blueprint.route('/movies_by_rank', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
 def movies_by_rank():
     # Read query parameters.
     target_rank = request.args.get('rank')
@@ -50,16 +48,6 @@ def movies_by_rank():
     # Fetch movie(s) for the target rank. This call also returns the previous and next rank for movies immediately
     # before and after the target rank.
     movie = services.get_movie(target_rank, repo.repo_instance)
-    movie_image = {}
-    title = movie["title"]
-    args = {"t": title}
-    link = "http://www.omdbapi.com/?{}&apikey=4421208f".format(urllib.parse.urlencode(args))
-    response = urlopen(link)
-    content = response.read()
-    content_dict = content.decode("UTF-8")
-    detail = ast.literal_eval(content_dict)
-    image = detail["Poster"]
-    movie_image[movie["title"]] = image
 
     previous_rank = target_rank - 1
     next_rank = target_rank + 1
@@ -86,13 +74,12 @@ def movies_by_rank():
         movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
 
         # Generate the webpage to display the movies.
+        utilities.show_movies([movie])
         return render_template(
             'movies/movies.html',
             title='Movie',
             movies_title='Rank' + str(target_rank),
             movies=[movie],
-            image=movie_image,
-            selected_movies=utilities.get_selected_movies(10),
             rank_urls=utilities.get_rank_and_url(),
             year_urls=utilities.get_years_and_urls(),
             genre_urls=utilities.get_genres_and_urls(),
@@ -108,6 +95,8 @@ def movies_by_rank():
 
 
 @movies_blueprint.route('/movies_by_year', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
 def movies_by_year():
     movies_per_page = 2
 
@@ -137,17 +126,6 @@ def movies_by_year():
     #movie_ranks = services.get_movies_by_year(year, repo.repo_instance)
     # Retrieve the batch of movies to display on the Web page.
     movies = services.get_movies_by_rank(movie_ranks[cursor:cursor + movies_per_page], repo.repo_instance)
-    movies_image = {}
-    for movie in movies:
-        title = movie["title"]
-        args = {"t": title}
-        link = "http://www.omdbapi.com/?{}&apikey=4421208f".format(urllib.parse.urlencode(args))
-        response = urlopen(link)
-        content = response.read()
-        content_dict = content.decode("UTF-8")
-        detail = ast.literal_eval(content_dict)
-        image = detail["Poster"]
-        movies_image[movie["title"]] = image
 
     first_movie_url = None
     last_movie_url = None
@@ -175,14 +153,13 @@ def movies_by_year():
         movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
 
     # Generate the webpage to display the movies.
+    utilities.show_movies(movies)
     return render_template(
         'movies/movies.html',
         #title='Movies',
         movies_title='Movies released in ' + str(year),
         #release_year=year,
         movies=movies,
-        image=movies_image,
-        selected_movies=utilities.get_selected_movies(10),#len(movies) * 2),
         year_urls=utilities.get_years_and_urls(),
         genre_urls=utilities.get_genres_and_urls(),
         rank_urls=utilities.get_rank_and_url(),
@@ -195,6 +172,8 @@ def movies_by_year():
 
 
 @movies_blueprint.route('/movies_by_genre', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
 def movies_by_genre():
     movies_per_page = 2
 
@@ -223,17 +202,6 @@ def movies_by_genre():
     # Retrieve the batch of movies to display on the Web page.
     movies = services.get_movies_by_rank(movie_ranks[cursor:cursor + movies_per_page], repo.repo_instance)
 
-    movies_image = {}
-    for movie in movies:
-        title = movie["title"]
-        args = {"t": title}
-        link = "http://www.omdbapi.com/?{}&apikey=4421208f".format(urllib.parse.urlencode(args))
-        response = urlopen(link)
-        content = response.read()
-        content_dict = content.decode("UTF-8")
-        detail = ast.literal_eval(content_dict)
-        image = detail["Poster"]
-        movies_image[movie["title"]] = image
 
     first_movie_url = None
     last_movie_url = None
@@ -261,13 +229,324 @@ def movies_by_genre():
         movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
 
     # Generate the webpage to display the movies.
+    utilities.show_movies(movies)
     return render_template(
         'movies/movies.html',
         #title='Movies',
         movies_title='Movies in ' + genre,
         movies=movies,
-        image=movies_image,
-        selected_movies=utilities.get_selected_movies(10),#len(movies) * 2),
+        year_urls=utilities.get_years_and_urls(),
+        genre_urls=utilities.get_genres_and_urls(),
+        rank_urls=utilities.get_rank_and_url(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=movie_to_show_reviews,
+    )
+
+
+# Facets that movies can be filtered on, with the headings they are listed under.
+FACET_TITLES = {
+    'release_year': 'Year',
+    'genre': 'Genre',
+    'director': 'Director',
+    'actor': 'Actor',
+}
+
+
+@movies_blueprint.route('/movies_by_filter', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
+def movies_by_filter():
+    movies_per_page = 2
+
+    # Read query parameters.
+    filters = {facet: request.args.get(facet) for facet in FACET_TITLES if request.args.get(facet)}
+    cursor = request.args.get('cursor')
+    movie_to_show_reviews = request.args.get('view_reviews_for')
+
+    # A release year that isn't a number is ignored, like the bounds of movies_by_range.
+    release_year = request.args.get('release_year', type=int)
+    if release_year is None:
+        filters.pop('release_year', None)
+    else:
+        filters['release_year'] = release_year
+
+    if movie_to_show_reviews is None:
+        # No view-reviews query parameter, so set to a non-existent movie rank.
+        movie_to_show_reviews = -1
+    else:
+        # Convert movie_to_show_reviews from string to int.
+        movie_to_show_reviews = int(movie_to_show_reviews)
+
+    if cursor is None:
+        # No cursor query parameter, so initialise cursor to start at the beginning.
+        cursor = 0
+    else:
+        # Convert cursor from string to int.
+        cursor = int(cursor)
+
+    # Retrieve movie ranks for movies that match every filter, and the counts for narrowing the selection further.
+    movie_ranks, facet_counts = services.filter_movies(filters, 10, repo.repo_instance)
+
+    # Retrieve the batch of movies to display on the Web page.
+    movies = services.get_movies_by_rank(movie_ranks[cursor:cursor + movies_per_page], repo.repo_instance)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        # There are preceding movies, so generate URLs for the 'previous' and 'first' navigation buttons.
+        prev_movie_url = url_for('movies_bp.movies_by_filter', cursor=cursor - movies_per_page, **filters)
+        first_movie_url = url_for('movies_bp.movies_by_filter', **filters)
+
+    if cursor + movies_per_page < len(movie_ranks):
+        # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
+        next_movie_url = url_for('movies_bp.movies_by_filter', cursor=cursor + movies_per_page, **filters)
+
+        last_cursor = movies_per_page * int(len(movie_ranks) / movies_per_page)
+        if len(movie_ranks) % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for('movies_bp.movies_by_filter', cursor=last_cursor, **filters)
+
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movies_bp.movies_by_filter', cursor=cursor, view_reviews_for=movie['rank'],
+                                           **filters)
+        movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
+
+    # Construct urls for narrowing the selection down by one more facet value.
+    facets = list()
+    for facet, counts in facet_counts.items():
+        values = list()
+        for value, count in counts:
+            url = url_for('movies_bp.movies_by_filter', **dict(filters, **{facet: value}))
+            values.append({'label': value, 'count': count, 'url': url})
+        facets.append({'title': FACET_TITLES[facet], 'values': values})
+
+    if len(filters) > 0:
+        movies_title = 'Movies with ' + ', '.join(str(value) for value in filters.values())
+    else:
+        movies_title = 'All movies'
+
+    # Generate the webpage to display the movies.
+    utilities.show_movies(movies)
+    return render_template(
+        'movies/movies.html',
+        movies_title=movies_title,
+        movies=movies,
+        facets=facets,
+        year_urls=utilities.get_years_and_urls(),
+        genre_urls=utilities.get_genres_and_urls(),
+        rank_urls=utilities.get_rank_and_url(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=movie_to_show_reviews,
+    )
+
+
+# Attributes that movies can be listed by range of, with their titles and the types of their bounds.
+RANGE_TITLES = {
+    'release_year': ('Year', int),
+    'runtime': ('Runtime', int),
+    'rating': ('Rating', float),
+    'votes': ('Votes', int),
+    'revenue': ('Revenue', float),
+    'metascore': ('Metascore', int),
+}
+
+
+@movies_blueprint.route('/movies_by_range', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
+def movies_by_range():
+    movies_per_page = 2
+
+    # Read query parameters, such as min_runtime=90&max_runtime=120; bounds that aren't numbers are ignored.
+    bounds = dict()
+    ranges = dict()
+    for attribute, (title, bound_type) in RANGE_TITLES.items():
+        minimum = request.args.get('min_' + attribute, type=bound_type)
+        maximum = request.args.get('max_' + attribute, type=bound_type)
+        if minimum is not None:
+            bounds['min_' + attribute] = minimum
+        if maximum is not None:
+            bounds['max_' + attribute] = maximum
+        if minimum is not None or maximum is not None:
+            ranges[attribute] = (minimum, maximum)
+    cursor = request.args.get('cursor')
+    movie_to_show_reviews = request.args.get('view_reviews_for')
+
+    if movie_to_show_reviews is None:
+        # No view-reviews query parameter, so set to a non-existent movie rank.
+        movie_to_show_reviews = -1
+    else:
+        # Convert movie_to_show_reviews from string to int.
+        movie_to_show_reviews = int(movie_to_show_reviews)
+
+    if cursor is None:
+        # No cursor query parameter, so initialise cursor to start at the beginning.
+        cursor = 0
+    else:
+        # Convert cursor from string to int.
+        cursor = int(cursor)
+
+    # Retrieve movie ranks for movies with attributes in every range.
+    movie_ranks = services.get_movies_in_ranges(ranges, repo.repo_instance)
+
+    # Retrieve the batch of movies to display on the Web page.
+    movies = services.get_movies_by_rank(movie_ranks[cursor:cursor + movies_per_page], repo.repo_instance)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        # There are preceding movies, so generate URLs for the 'previous' and 'first' navigation buttons.
+        prev_movie_url = url_for('movies_bp.movies_by_range', cursor=cursor - movies_per_page, **bounds)
+        first_movie_url = url_for('movies_bp.movies_by_range', **bounds)
+
+    if cursor + movies_per_page < len(movie_ranks):
+        # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
+        next_movie_url = url_for('movies_bp.movies_by_range', cursor=cursor + movies_per_page, **bounds)
+
+        last_cursor = movies_per_page * int(len(movie_ranks) / movies_per_page)
+        if len(movie_ranks) % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for('movies_bp.movies_by_range', cursor=last_cursor, **bounds)
+
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movies_bp.movies_by_range', cursor=cursor, view_reviews_for=movie['rank'],
+                                           **bounds)
+        movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
+
+    descriptions = list()
+    for attribute, (minimum, maximum) in ranges.items():
+        title = RANGE_TITLES[attribute][0]
+        if maximum is None:
+            descriptions.append('{} from {}'.format(title, minimum))
+        elif minimum is None:
+            descriptions.append('{} up to {}'.format(title, maximum))
+        else:
+            descriptions.append('{} {} to {}'.format(title, minimum, maximum))
+    if len(descriptions) > 0:
+        movies_title = 'Movies with ' + ', '.join(descriptions)
+    else:
+        movies_title = 'All movies'
+
+    # Summarise the ratings of every movie in the ranges, not only those on this page.
+    summary = None
+    ratings = services.get_movie_statistics('rating', movie_ranks, repo.repo_instance)
+    if ratings['count'] > 0:
+        summary = '{} movies, rated {} to {}, {:.1f} on average'.format(
+            len(movie_ranks), ratings['minimum'], ratings['maximum'], ratings['mean'])
+
+    # Generate the webpage to display the movies.
+    utilities.show_movies(movies)
+    return render_template(
+        'movies/movies.html',
+        movies_title=movies_title,
+        summary=summary,
+        movies=movies,
+        year_urls=utilities.get_years_and_urls(),
+        genre_urls=utilities.get_genres_and_urls(),
+        rank_urls=utilities.get_rank_and_url(),
+        first_movie_url=first_movie_url,
+        last_movie_url=last_movie_url,
+        prev_movie_url=prev_movie_url,
+        next_movie_url=next_movie_url,
+        show_reviews_for_movie=movie_to_show_reviews,
+    )
+
+
+@movies_blueprint.route('/movies_by_order', methods=['GET'])
+@utilities.conditional_page
+@utilities.cached_page
+def movies_by_order():
+    movies_per_page = 2
+
+    # Read query parameters, such as sort=rating&order=desc.
+    sort = request.args.get('sort')
+    order = request.args.get('order')
+    cursor = request.args.get('cursor')
+    movie_to_show_reviews = request.args.get('view_reviews_for')
+
+    if sort not in RANGE_TITLES:
+        sort = 'rating'
+    if order != 'asc':
+        order = 'desc'
+
+    if movie_to_show_reviews is None:
+        # No view-reviews query parameter, so set to a non-existent movie rank.
+        movie_to_show_reviews = -1
+    else:
+        # Convert movie_to_show_reviews from string to int.
+        movie_to_show_reviews = int(movie_to_show_reviews)
+
+    if cursor is None:
+        # No cursor query parameter, so initialise cursor to start at the beginning.
+        cursor = 0
+    else:
+        # Convert cursor from string to int; a negative cursor starts at the beginning.
+        cursor = max(0, int(cursor))
+
+    # Retrieve the ranks of the movies on this page, in order, and the number of movies in the order.
+    movie_ranks, number_of_movies = services.get_movies_sorted_by(sort, cursor, movies_per_page, order == 'desc',
+                                                                  repo.repo_instance)
+
+    # Retrieve the batch of movies to display on the Web page.
+    movies = services.get_movies_by_rank(movie_ranks, repo.repo_instance)
+
+    first_movie_url = None
+    last_movie_url = None
+    next_movie_url = None
+    prev_movie_url = None
+
+    if cursor > 0:
+        # There are preceding movies, so generate URLs for the 'previous' and 'first' navigation buttons.
+        prev_movie_url = url_for('movies_bp.movies_by_order', sort=sort, order=order, cursor=cursor - movies_per_page)
+        first_movie_url = url_for('movies_bp.movies_by_order', sort=sort, order=order)
+
+    if cursor + movies_per_page < number_of_movies:
+        # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
+        next_movie_url = url_for('movies_bp.movies_by_order', sort=sort, order=order, cursor=cursor + movies_per_page)
+
+        last_cursor = movies_per_page * int(number_of_movies / movies_per_page)
+        if number_of_movies % movies_per_page == 0:
+            last_cursor -= movies_per_page
+        last_movie_url = url_for('movies_bp.movies_by_order', sort=sort, order=order, cursor=last_cursor)
+
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movies_bp.movies_by_order', sort=sort, order=order, cursor=cursor,
+                                           view_reviews_for=movie['rank'])
+        movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
+
+    # Construct urls for listing the movies in the other orders.
+    orders = list()
+    for attribute, (title, bound_type) in RANGE_TITLES.items():
+        orders.append({'label': title, 'url': url_for('movies_bp.movies_by_order', sort=attribute, order=order)})
+    orders.append({'label': 'Lowest first' if order == 'desc' else 'Highest first',
+                   'url': url_for('movies_bp.movies_by_order', sort=sort, order='asc' if order == 'desc' else 'desc')})
+
+    movies_title = 'Movies by {}, {}'.format(RANGE_TITLES[sort][0].lower(),
+                                            'highest first' if order == 'desc' else 'lowest first')
+
+    # Generate the webpage to display the movies.
+    utilities.show_movies(movies)
+    return render_template(
+        'movies/movies.html',
+        movies_title=movies_title,
+        summary='{} movies with a known {}'.format(number_of_movies, RANGE_TITLES[sort][0].lower()),
+        facets=[{'title': 'Sort by', 'values': orders}],
+        movies=movies,
         year_urls=utilities.get_years_and_urls(),
         genre_urls=utilities.get_genres_and_urls(),
         rank_urls=utilities.get_rank_and_url(),
@@ -326,10 +605,6 @@ def review_on_movie():
         movie=movie,
         form=form,
         handler_url=url_for('movies_bp.review_on_movie'),
-        selected_movies=utilities.get_selected_movies(),
-        genre_urls=utilities.get_genres_and_urls(),
-        year_urls=utilities.get_years_and_urls(),
-        rank_urls=utilities.get_rank_and_url(),
     )
 
 
@@ -355,36 +630,11 @@ def movies_by_search():
         # Convert cursor from string to int.
         cursor = int(cursor)
 
-    all_movies = services.get_all_movies(repo.repo_instance)
-    movie_ranks = []
-    if q:
-        for movie in all_movies:
-            try:
-                q = int(q)
-                if q in movie.values():
-                    if movie['rank'] not in movie_ranks:
-                        movie_ranks.append(movie['rank'])
-            except:
-                pass
-            if q in movie.values() or q in movie['actors'] or q in movie['genres']:
-                if movie['rank'] not in movie_ranks:
-                    movie_ranks.append(movie['rank'])
+    # Retrieve the ranks of the best matching movies for this page, and the number of matching movies.
+    movie_ranks, number_of_results = services.search_movies(q or '', cursor, movies_per_page, repo.repo_instance)
 
     # Retrieve the batch of movies to display on the Web page.
-    movies = services.get_movies_by_rank(movie_ranks[cursor:cursor + movies_per_page], repo.repo_instance)
-
-
-    movies_image = {}
-    for movie in movies:
-        title = movie["title"]
-        args = {"t": title}
-        link = "http://www.omdbapi.com/?{}&apikey=4421208f".format(urllib.parse.urlencode(args))
-        response = urlopen(link)
-        content = response.read()
-        content_dict = content.decode("UTF-8")
-        detail = ast.literal_eval(content_dict)
-        image = detail["Poster"]
-        movies_image[movie["title"]] = image
+    movies = services.get_movies_by_rank(movie_ranks, repo.repo_instance)
 
     first_movie_url = None
     last_movie_url = None
@@ -396,27 +646,26 @@ def movies_by_search():
         prev_movie_url = url_for('movies_bp.movies_by_search', q=q, cursor=cursor - movies_per_page)
         first_movie_url = url_for('movies_bp.movies_by_search', q=q)
 
-    if cursor + movies_per_page < len(movie_ranks):
+    if cursor + movies_per_page < number_of_results:
         # There are further movies, so generate URLs for the 'next' and 'last' navigation buttons.
         next_movie_url = url_for('movies_bp.movies_by_search', q=q, cursor=cursor + movies_per_page)
 
-        last_cursor = movies_per_page * int(len(movie_ranks) / movies_per_page)
-        if len(movie_ranks) % movies_per_page == 0:
+        last_cursor = movies_per_page * int(number_of_results / movies_per_page)
+        if number_of_results % movies_per_page == 0:
             last_cursor -= movies_per_page
         last_movie_url = url_for('movies_bp.movies_by_search', q=q, cursor=last_cursor)
 
-        # Construct urls for viewing movie reviews and adding reviews.
-        for movie in movies:
-            movie['view_review_url'] = url_for('movies_bp.movies_by_search', q=q, cursor=cursor,
-                                                   view_reviews_for=movie['rank'])
-            movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
+    # Construct urls for viewing movie reviews and adding reviews.
+    for movie in movies:
+        movie['view_review_url'] = url_for('movies_bp.movies_by_search', q=q, cursor=cursor,
+                                           view_reviews_for=movie['rank'])
+        movie['add_review_url'] = url_for('movies_bp.review_on_movie', movie=movie['rank'])
 
-    if movie_ranks == []:
+    if number_of_results == 0:
         return render_template(
             'movies/movies.html',
             movies_title='Search result: Not Found',
             #movies=movies,
-            selected_movies=utilities.get_selected_movies(10),
             year_urls=utilities.get_years_and_urls(),
             genre_urls=utilities.get_genres_and_urls(),
             rank_urls=utilities.get_rank_and_url(),
@@ -431,8 +680,6 @@ def movies_by_search():
         'movies/movies.html',
         movies_title='Search result: ' + str(q),
         movies=movies,
-        image=movies_image,
-        selected_movies=utilities.get_selected_movies(10),
         year_urls=utilities.get_years_and_urls(),
         genre_urls=utilities.get_genres_and_urls(),
         rank_urls=utilities.get_rank_and_url(),
@@ -444,6 +691,28 @@ def movies_by_search():
     )
 
 
+@movies_blueprint.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    # Read query parameters.
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 20)
+
+    completions = services.get_completions(prefix, limit, repo.repo_instance)
+
+    # Titles lead to their movie, names to the search results for the name.
+    for completion in completions:
+        if completion['kind'] == 'title':
+            completion['url'] = url_for('movies_bp.movies_by_rank', rank=completion['rank'])
+        else:
+            completion['url'] = url_for('movies_bp.movies_by_search', q=completion['label'])
+
+    # Completions only change with the catalog, and the same prefixes are typed over and over again.
+    response = jsonify(completions=completions)
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response
+
+
 class ProfanityFree:
     def __init__(self, message=None):
         if not message:
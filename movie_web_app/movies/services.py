@@ -1,6 +1,11 @@
+import sys
+
 from typing import List, Iterable
 
+import movie_web_app.utilities.page_cache as page_cache
+
 from movie_web_app.adapters.repository import AbstractRepository
+from movie_web_app.adapters.search_index import tokenize
 from movie_web_app.domain.model import Movie, Director, Actor, Genre, User, Review, WatchList, make_review
 
 
@@ -30,6 +35,10 @@ def add_review(movie_rank: int, review_text: str, rating: int, username: str, re
     # Update the repository.
     repo.add_review(review)
 
+    # Cached pages showing the movie would still show its old reviews.
+    if page_cache.cache_instance is not None:
+        page_cache.cache_instance.invalidate_movie(movie.rank)
+
 
 def get_movie(rank: int, repo: AbstractRepository):
     movie = repo.get_movie(rank)
@@ -80,11 +89,70 @@ def get_movie_ranks_for_year(year, repo: AbstractRepository):
     return movie_ranks
 
 
+def filter_movies(filters: dict, facet_limit: int, repo: AbstractRepository):
+    # Returns the ranks of the movies matching every filter, and counts of the most frequent values of the facets that
+    # aren't filtered on.
+    movie_ranks, facet_counts = repo.filter_movies(facet_limit=facet_limit, **filters)
+    return movie_ranks, facet_counts
+
+
+def get_movies_in_ranges(ranges: dict, repo: AbstractRepository):
+    # Returns the ranks of the movies with attributes in every one of ranges, given as (minimum, maximum) tuples.
+    return repo.get_movies_in_ranges(ranges)
+
+
+def get_movies_sorted_by(attribute: str, cursor: int, quantity: int, descending: bool, repo: AbstractRepository):
+    # Returns the ranks of a page of the movies in order of attribute, and the number of movies in the order.
+    return repo.get_movies_sorted_by(attribute, cursor, quantity, descending)
+
+
+def get_movie_statistics(attribute: str, movie_ranks, repo: AbstractRepository):
+    # Returns the number of the movies with a value of attribute, and its minimum, maximum and mean.
+    return repo.get_movie_statistics(attribute, movie_ranks)
+
+
 def get_movie_ranks_for_genre(genre, repo: AbstractRepository):
     movie_ranks = repo.get_movie_with_given_genre(genre)
     return movie_ranks
 
 
+# Search results computed so far, as (ranks of the best matches, number of matches) tuples keyed by normalized query
+# and catalog version, so that paging through the results does not run the search again for every page.
+search_cache = None
+
+
+def search_result_size(result):
+    # Approximate memory held by a cached search result.
+    movie_ranks, number_of_results = result
+    return sys.getsizeof(movie_ranks) + sum(sys.getsizeof(rank) for rank in movie_ranks)
+
+
+def search_movies(query: str, cursor: int, quantity: int, repo: AbstractRepository):
+    # Returns the ranks of the movies on one page of search results, most relevant first, and the number of results.
+    key = (' '.join(sorted(set(tokenize(query)))), repo.get_catalog_version())
+    result = search_cache.get(key) if search_cache is not None else None
+
+    end = cursor + quantity
+    if result is None or (len(result[0]) < end and len(result[0]) < result[1]):
+        # Fetch at least twice as many results as last time, so that paging through all the results costs no more
+        # than a couple of searches.
+        limit = 2 * max(end, len(result[0]) if result is not None else 0)
+        result = repo.search_movies(query, limit=limit)
+        if result[1] == 0:
+            # No movie contains every word, so the query may be misspelled; look for similarly spelled titles and names.
+            result = repo.search_similar_movies(query, limit=limit)
+        if search_cache is not None:
+            search_cache.put(key, result)
+
+    movie_ranks, number_of_results = result
+    return movie_ranks[cursor:end], number_of_results
+
+
+def get_completions(prefix: str, quantity: int, repo: AbstractRepository):
+    completions = repo.get_completions(prefix, quantity)
+    return [{'label': label, 'kind': kind, 'rank': rank} for label, kind, rank in completions]
+
+
 def get_movies_by_rank(rank_list, repo: AbstractRepository):
     movies = repo.get_movies_by_rank(rank_list)
 
@@ -108,7 +176,7 @@ def get_reviews_for_movie(movie_rank, repo: AbstractRepository):
     if movie is None:
         raise NonExistentMovieException
 
-    return reviews_to_dict(movie.reviews)
+    return reviews_to_dict(repo.get_reviews_for_movie(movie_rank))
 
 
 # ============================================
@@ -125,6 +193,10 @@ def movie_to_dict(movie: Movie):
         'actors': movie.actors,
         'genres': movie.genres,
         'runtime': movie.runtime_minutes,
+        'rating': movie.rating,
+        'votes': movie.votes,
+        'revenue': movie.revenue,
+        'metascore': movie.metascores,
         'reviews': reviews_to_dict(movie.reviews),
         #'years': years_to_dict(movie.release_year)
     }
@@ -0,0 +1,95 @@
+import click
+
+import os
+
+from flask import Blueprint, current_app, request, redirect, url_for, abort, send_file
+
+import movie_web_app.adapters.repository as repo
+import movie_web_app.adapters.poster_cache as poster_cache
+import movie_web_app.adapters.image_store as image_store
+import movie_web_app.posters.services as services
+
+
+# Configure Blueprint. Its command line interface is available as 'flask posters ...'.
+posters_blueprint = Blueprint(
+    'posters_bp', __name__, cli_group='posters')
+
+# Resolved posters are stable, so browsers may keep the redirect for a day. The placeholder is only shown until the
+# real poster has been resolved in the background, so browsers should ask again soon.
+POSTER_MAX_AGE = 24 * 60 * 60
+PLACEHOLDER_MAX_AGE = 60
+
+# Images are served by content digest, so a cached copy only goes stale if the movie's poster changes upstream.
+POSTER_IMAGE_MAX_AGE = 30 * 24 * 60 * 60
+
+
+@posters_blueprint.route('/posters/<int:rank>', methods=['GET'])
+def poster(rank):
+    try:
+        poster_url = services.get_poster_for_movie(rank, repo.repo_instance, poster_cache.cache_instance)
+    except services.NonExistentMovieException:
+        abort(404)
+
+    if poster_url is None:
+        response = redirect(url_for('static', filename='images/poster_placeholder.svg'))
+        response.cache_control.max_age = PLACEHOLDER_MAX_AGE
+    else:
+        response = redirect(poster_url)
+        response.cache_control.max_age = POSTER_MAX_AGE
+    response.cache_control.public = True
+    return response
+
+
+@posters_blueprint.route('/posters/<int:rank>/image', methods=['GET'])
+def poster_image(rank):
+    try:
+        poster_url = services.get_poster_for_movie(rank, repo.repo_instance, poster_cache.cache_instance)
+    except services.NonExistentMovieException:
+        abort(404)
+
+    if poster_url is None:
+        return send_placeholder()
+
+    if image_store.store_instance is None:
+        # No local image cache is configured, so hand the browser over to the poster host.
+        return redirect(url_for('posters_bp.poster', rank=rank))
+
+    try:
+        path, mimetype, digest = image_store.store_instance.get_image(poster_url)
+    except image_store.ImageDownloadException:
+        return send_placeholder()
+
+    # send_file hands the open file to the WSGI server, which can then use sendfile. The content digest makes a
+    # stronger validator than the file's modification time, which the image store updates on every access.
+    response = send_file(path, mimetype=mimetype, add_etags=False, cache_timeout=POSTER_IMAGE_MAX_AGE)
+    response.set_etag(digest)
+    response.last_modified = None
+    response.cache_control.public = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=os.path.getsize(path))
+
+
+def send_placeholder():
+    response = send_file(os.path.join(current_app.static_folder, 'images', 'poster_placeholder.svg'),
+                         conditional=True, cache_timeout=PLACEHOLDER_MAX_AGE)
+    response.cache_control.public = True
+    return response
+
+
+@posters_blueprint.cli.command('warm')
+@click.option('--workers', default=8, show_default=True, help='Number of concurrent OMDb lookups.')
+@click.option('--rate', default=5.0, show_default=True, help='Maximum OMDb lookups per second.')
+@click.option('--checkpoint', default='posters-warm-up.json', show_default=True,
+              help='File recording resolved movies, so that an interrupted run can be resumed.')
+def warm(workers, rate, checkpoint):
+    """Resolve and cache the poster of every movie in the catalog."""
+    if not current_app.config['POSTER_CACHE_PATH']:
+        raise click.ClickException('POSTER_CACHE_PATH is not set, so resolved posters would not outlive this command.')
+
+    summary = services.warm_up_posters(repo.repo_instance.all_movies(), poster_cache.cache_instance,
+                                       checkpoint_path=checkpoint, workers=workers, rate=rate)
+
+    click.echo('Posters for {} movies: {} resolved, {} without a poster, {} failed, {} skipped from checkpoint.'.format(
+        summary['total'], summary['resolved'], summary['not_found'], summary['failed'], summary['skipped']))
+    click.echo('Took {:.1f}s ({:.1f} movies/s).'.format(summary['seconds'], summary['movies_per_second']))
+    if summary['failed'] > 0:
+        click.echo('Run the command again to retry the failed lookups.')
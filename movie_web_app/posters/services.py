@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from movie_web_app.adapters.omdb import OmdbException
+from movie_web_app.adapters.poster_cache import PosterCache
+from movie_web_app.adapters.repository import AbstractRepository
+
+
+class NonExistentMovieException(Exception):
+    pass
+
+
+def get_poster_for_movie(rank: int, repo: AbstractRepository, poster_cache: PosterCache, deadline: float = None):
+    # Returns the poster URL of the movie with the given rank, or None if it has no poster or it isn't resolved yet.
+    movie = repo.get_movie(rank)
+    if movie is None:
+        raise NonExistentMovieException
+
+    return poster_cache.get_posters([movie.title], deadline=deadline)[movie.title]
+
+
+class RateLimiter:
+    """ Spaces calls to acquire() so that no more than rate of them return per second, across all threads. """
+
+    def __init__(self, rate: float):
+        self.__interval = 1.0 / rate if rate > 0 else 0.0
+        self.__next_slot = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot)
+            self.__next_slot = slot + self.__interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def read_checkpoint(checkpoint_path: str):
+    # Returns the set of movie ranks a previous warm-up run has already resolved.
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint_file:
+        return set(json.load(checkpoint_file))
+
+
+def write_checkpoint(checkpoint_path: str, done_ranks):
+    # Write to a temporary file first, so that an interrupted run never leaves a truncated checkpoint behind.
+    temporary_path = checkpoint_path + '.tmp'
+    with open(temporary_path, 'w') as checkpoint_file:
+        json.dump(sorted(done_ranks), checkpoint_file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def warm_up_posters(movies, poster_cache: PosterCache, checkpoint_path: str = None, workers: int = 8,
+                    rate: float = 5.0, checkpoint_every: int = 50):
+    """ Resolves and caches the poster of every movie, and returns a summary of the run.
+
+    Movies recorded in the checkpoint file by an earlier run are skipped. Lookups that fail are counted and left out
+    of the checkpoint, so that running the warm-up again retries them. Without a persistent store, resolved posters
+    are lost when the process exits, so no checkpoint is read or written.
+    """
+    if not poster_cache.persistent:
+        checkpoint_path = None
+    done_ranks = read_checkpoint(checkpoint_path)
+    to_resolve = [movie for movie in movies if movie.rank not in done_ranks]
+    summary = {
+        'total': len(to_resolve) + len(done_ranks),
+        'skipped': len(done_ranks),
+        'resolved': 0,
+        'not_found': 0,
+        'failed': 0,
+    }
+    limiter = RateLimiter(rate)
+    lock = threading.Lock()
+
+    def resolve(movie):
+        limiter.acquire()
+        try:
+            poster = poster_cache.load_poster(movie.title)
+        except OmdbException:
+            with lock:
+                summary['failed'] += 1
+            return
+
+        with lock:
+            summary['resolved' if poster is not None else 'not_found'] += 1
+            done_ranks.add(movie.rank)
+            if checkpoint_path is not None and len(done_ranks) % checkpoint_every == 0:
+                write_checkpoint(checkpoint_path, done_ranks)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='poster-warm-up') as executor:
+        # Consume the results so that unexpected exceptions in a worker surface here.
+        list(executor.map(resolve, to_resolve))
+    seconds = time.perf_counter() - started
+
+    if checkpoint_path is not None:
+        write_checkpoint(checkpoint_path, done_ranks)
+
+    summary['seconds'] = seconds
+    summary['movies_per_second'] = len(to_resolve) / seconds if seconds > 0 else 0.0
+    return summary
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """ A thread-safe, size-bounded, least-recently-used cache with optional per-entry expiry.
+
+    If a sizeof function is given, the cache also keeps count of the total size of its values, as reported by sizeof.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None, sizeof=None):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__sizeof = sizeof
+        self.__bytes = 0
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key, default=None):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return default
+
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                # Expired entries are treated as misses and dropped straight away.
+                del self.__entries[key]
+                self.__bytes -= size
+                self.__misses += 1
+                return default
+
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def put(self, key, value, ttl: float = None):
+        if ttl is None:
+            ttl = self.__ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        size = self.__sizeof(value) if self.__sizeof is not None else 0
+
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__bytes -= previous[2]
+            self.__entries[key] = (value, expires_at, size)
+            self.__bytes += size
+            while len(self.__entries) > self.__max_entries:
+                self.__bytes -= self.__entries.popitem(last=False)[1][2]
+                self.__evictions += 1
+
+    def pop(self, key, default=None):
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                self.__bytes -= entry[2]
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def __contains__(self, key):
+        with self.__lock:
+            return key in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def stats(self):
+        lookups = self.__hits + self.__misses
+        stats = {
+            'entries': len(self.__entries),
+            'max_entries': self.__max_entries,
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'evictions': self.__evictions,
+            'hit_ratio': self.__hits / lookups if lookups else 0.0,
+        }
+        if self.__sizeof is not None:
+            stats['bytes'] = self.__bytes
+        return stats
@@ -0,0 +1,95 @@
+import threading
+
+from collections import OrderedDict
+
+cache_instance = None
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class PageCache:
+    """ LRU cache of rendered pages, bounded both in number of pages and in total bytes of page content.
+
+    Each page is stored along with the ranks of the movies it shows, so that a change to one movie (such as a new
+    review) invalidates exactly the pages showing that movie.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__pages = OrderedDict()
+        self.__keys_by_movie = dict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__invalidations = 0
+
+    def get(self, key):
+        """ Returns (body, content_type) of the cached page, or None. """
+        with self.__lock:
+            page = self.__pages.get(key)
+            if page is None:
+                self.__misses += 1
+                return None
+
+            self.__pages.move_to_end(key)
+            self.__hits += 1
+            return page[0], page[1]
+
+    def put(self, key, body: bytes, content_type: str, movie_ranks=()):
+        if len(body) > self.__max_bytes:
+            return
+
+        with self.__lock:
+            self.__remove(key)
+            self.__pages[key] = (body, content_type, frozenset(movie_ranks))
+            self.__bytes += len(body)
+            for rank in movie_ranks:
+                self.__keys_by_movie.setdefault(rank, set()).add(key)
+
+            while len(self.__pages) > self.__max_entries or self.__bytes > self.__max_bytes:
+                self.__remove(next(iter(self.__pages)))
+                self.__evictions += 1
+
+    def invalidate_movie(self, rank):
+        """ Drops every cached page that shows the movie with the given rank. """
+        with self.__lock:
+            for key in list(self.__keys_by_movie.get(rank, ())):
+                self.__remove(key)
+                self.__invalidations += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__pages.clear()
+            self.__keys_by_movie.clear()
+            self.__bytes = 0
+
+    def __remove(self, key):
+        page = self.__pages.pop(key, None)
+        if page is None:
+            return
+
+        self.__bytes -= len(page[0])
+        for rank in page[2]:
+            keys = self.__keys_by_movie[rank]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.__keys_by_movie[rank]
+
+    @property
+    def stats(self):
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                'entries': len(self.__pages),
+                'bytes': self.__bytes,
+                'max_entries': self.__max_entries,
+                'max_bytes': self.__max_bytes,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'invalidations': self.__invalidations,
+                'hit_ratio': self.__hits / lookups if lookups else 0.0,
+            }
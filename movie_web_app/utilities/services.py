@@ -13,6 +13,18 @@ def get_genres_list(repo: AbstractRepository):
     return repo.get_genre_list()
 
 
+def get_catalog_version(repo: AbstractRepository):
+    return repo.get_catalog_version()
+
+
+def get_review_version(repo: AbstractRepository):
+    return repo.get_review_version()
+
+
+def get_movie_ranks(repo: AbstractRepository):
+    return [movie.rank for movie in repo.all_movies()]
+
+
 def get_movies_in_rank(quantity, repo: AbstractRepository):
     movie_size = repo.get_number_of_movies()
 
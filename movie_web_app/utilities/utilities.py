@@ -1,7 +1,20 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session
+import hashlib
+import os
+
+from collections.abc import Mapping
+from functools import wraps
+
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, session, jsonify, g, \
+    make_response
+from markupsafe import Markup
 
 import movie_web_app.adapters.repository as repo
+import movie_web_app.adapters.omdb as omdb
+import movie_web_app.adapters.poster_cache as poster_cache
+import movie_web_app.adapters.image_store as image_store
+import movie_web_app.utilities.page_cache as page_cache
 import movie_web_app.utilities.services as services
+import movie_web_app.movies.services as movies_services
 
 
 # Configure Blueprint.
@@ -9,36 +22,228 @@ utilities_blueprint = Blueprint(
     'utilities_bp', __name__)
 
 
+class LazyUrlMap(Mapping):
+    """ Read-only mapping from keys to URLs for an endpoint, generating each URL only when it is first looked up.
+
+    Templates only look up the handful of URLs they render, so the cost of a URL table is proportional to what a page
+    shows rather than to the size of the catalog.
+    """
+
+    def __init__(self, keys, endpoint: str, argument: str):
+        self.__keys = list(keys)
+        self.__key_set = set(self.__keys)
+        self.__endpoint = endpoint
+        self.__argument = argument
+        self.__urls = dict()
+
+    def __getitem__(self, key):
+        url = self.__urls.get(key)
+        if url is None:
+            if key not in self.__key_set:
+                raise KeyError(key)
+            url = url_for(self.__endpoint, **{self.__argument: key})
+            self.__urls[key] = url
+        return url
+
+    def __contains__(self, key):
+        return key in self.__key_set
+
+    def __iter__(self):
+        return iter(self.__keys)
+
+    def __len__(self):
+        return len(self.__keys)
+
+
+# Navigation data (URL tables, year and genre lists, the top movies in the sidebar) only changes when movies are added
+# to the catalog. Each table is built once and reused by later requests until the repository or its catalog version
+# changes.
+navigation_tables = dict()
+
+
+def get_navigation_table(name, build_table):
+    catalog_version = services.get_catalog_version(repo.repo_instance)
+    entry = navigation_tables.get(name)
+    if entry is None or entry[0] is not repo.repo_instance or entry[1] != catalog_version:
+        entry = (repo.repo_instance, catalog_version, build_table())
+        navigation_tables[name] = entry
+
+    return entry[2]
+
+
 def get_rank_and_url():
-    rank_urls = dict()
-    for rank in range(1000):
-        rank_urls[rank] = url_for('movies_bp.movies_by_rank', rank=rank)
+    def build_rank_urls():
+        return LazyUrlMap(services.get_movie_ranks(repo.repo_instance), 'movies_bp.movies_by_rank', 'rank')
 
-    return rank_urls
+    return get_navigation_table('rank_urls', build_rank_urls)
 
 
 def get_years_and_urls():
-    year_list = services.get_years(repo.repo_instance)
-    year_urls = dict()
-    for year in year_list:
-        year_urls[year] = url_for('movies_bp.movies_by_year', release_year=year)
+    def build_year_urls():
+        year_list = services.get_years(repo.repo_instance)
+        return LazyUrlMap(year_list, 'movies_bp.movies_by_year', 'release_year')
 
-    return year_urls
+    return get_navigation_table('year_urls', build_year_urls)
 
 
 def get_genres_and_urls():
-    genres_list = services.get_genres_list(repo.repo_instance)
-    genre_urls = dict()
-    for genre in genres_list:
-        genre_urls[genre] = url_for('movies_bp.movies_by_genre', genre=genre)
+    def build_genre_urls():
+        genres_list = services.get_genres_list(repo.repo_instance)
+        return LazyUrlMap(genres_list, 'movies_bp.movies_by_genre', 'genre')
 
-    return genre_urls
+    return get_navigation_table('genre_urls', build_genre_urls)
 
 
 def get_selected_movies(quantity = 10):
-    movies = services.get_movies_in_rank(quantity, repo.repo_instance)
-
-    for movie in movies:
-        movie['hyperlink'] = url_for('movies_bp.movies_by_rank', rank=movie['rank'])
-    return movies
-
+    def build_selected_movies():
+        movies = services.get_movies_in_rank(quantity, repo.repo_instance)
+
+        for movie in movies:
+            movie['hyperlink'] = url_for('movies_bp.movies_by_rank', rank=movie['rank'])
+        return movies
+
+    return get_navigation_table('selected_movies_{}'.format(quantity), build_selected_movies)
+
+
+# Rendered HTML of partials that are the same for every visitor, keyed by template name and catalog version.
+fragment_cache = None
+
+
+@utilities_blueprint.app_template_global()
+def cached_fragment(template_name):
+    """ Renders a user-independent partial template, reusing its HTML until the catalog changes. """
+    key = (template_name, services.get_catalog_version(repo.repo_instance))
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(render_template(
+            template_name,
+            selected_movies=get_selected_movies(),
+            rank_urls=get_rank_and_url(),
+            year_urls=get_years_and_urls(),
+            genre_urls=get_genres_and_urls(),
+        ))
+        fragment_cache.put(key, html)
+
+    return html
+
+
+def cached_page(view):
+    """ Serves anonymous GET requests for the decorated view from the page cache.
+
+    Pages are keyed by their full URL and the catalog version. A view reports the movies a page shows through
+    show_movies(), so that a new review on one of them drops the page from the cache. With a database repository,
+    reviews may also come from other processes sharing the database, which can't drop pages from this cache, so pages
+    are keyed by the review version stored in the database as well. Pages for logged in users show their username, so
+    they are always rendered.
+    """
+    @wraps(view)
+    def cached_view(**kwargs):
+        cache = page_cache.cache_instance
+        if cache is None or request.method != 'GET' or 'username' in session:
+            return view(**kwargs)
+
+        key = (request.full_path, services.get_catalog_version(repo.repo_instance))
+        if current_app.config['REPOSITORY'] == 'database':
+            key += (services.get_review_version(repo.repo_instance),)
+        page = cache.get(key)
+        if page is not None:
+            body, content_type = page
+            return make_response(body, 200, {'Content-Type': content_type})
+
+        g.page_movie_ranks = set()
+        review_version = services.get_review_version(repo.repo_instance)
+        response = make_response(view(**kwargs))
+        # A review added while the page rendered has already invalidated the pages showing its movie, so a page that
+        # may predate it isn't cached.
+        if response.status_code == 200 and not response.direct_passthrough and \
+                services.get_review_version(repo.repo_instance) == review_version:
+            cache.put(key, response.get_data(), response.content_type, g.page_movie_ranks)
+        return response
+
+    return cached_view
+
+
+def conditional_page(view):
+    """ Tags pages of the decorated view with an ETag, and answers a matching If-None-Match with 304.
+
+    A page only changes when the catalog or its reviews change, or when a different user views it, so the ETag is
+    derived from those alone and a repeat visit is answered before the view renders anything.
+    """
+    @wraps(view)
+    def conditional_view(**kwargs):
+        if request.method != 'GET':
+            return view(**kwargs)
+
+        etag = page_etag()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(**kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        # Browsers may keep the page, but have to check that it is still current before showing it again.
+        response.cache_control.no_cache = True
+        if 'username' in session:
+            response.cache_control.private = True
+        return response
+
+    return conditional_view
+
+
+# Version of the code, templates and data the pages are rendered from, set when the app is created. The repository's
+# catalog and review versions restart from the same values whenever the app starts, so without it a browser could keep
+# a page rendered by an earlier deployment.
+application_version = ''
+
+# Files that pages are rendered from; the stylesheet, scripts and images are cached by browsers separately.
+APPLICATION_FILE_SUFFIXES = ('.py', '.html', '.csv')
+
+
+def get_application_version(*directories):
+    """ Returns a digest of the code, template and data files in directories.
+
+    Every process of the same deployment derives the same version, so they agree on ETags.
+    """
+    digest = hashlib.sha1()
+    for directory in directories:
+        for path, directory_names, file_names in os.walk(directory):
+            directory_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(APPLICATION_FILE_SUFFIXES):
+                    file_path = os.path.join(path, file_name)
+                    digest.update(os.path.relpath(file_path, directory).encode('UTF-8'))
+                    with open(file_path, 'rb') as application_file:
+                        digest.update(application_file.read())
+    return digest.hexdigest()
+
+
+def page_etag():
+    validator = '{}:{}:{}:{}:{}'.format(
+        application_version,
+        services.get_catalog_version(repo.repo_instance),
+        services.get_review_version(repo.repo_instance),
+        request.full_path,
+        session.get('username', ''),
+    )
+    return hashlib.sha1(validator.encode('UTF-8')).hexdigest()
+
+
+def show_movies(movies):
+    # Records the movies (in dict form) that the page being rendered shows, for invalidation of the page cache.
+    if 'page_movie_ranks' in g:
+        g.page_movie_ranks.update(movie['rank'] for movie in movies)
+
+
+@utilities_blueprint.route('/stats', methods=['GET'])
+def stats():
+    # Expose cache and OMDb client counters, so that cache sizes and timeouts can be tuned.
+    return jsonify(
+        posters=poster_cache.cache_instance.stats,
+        fragments=fragment_cache.stats,
+        pages=page_cache.cache_instance.stats if page_cache.cache_instance is not None else None,
+        searches=movies_services.search_cache.stats,
+        omdb=omdb.client_instance.stats,
+        poster_images=image_store.store_instance.stats if image_store.store_instance is not None else None,
+    )
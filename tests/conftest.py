@@ -5,7 +5,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
 from movie_web_app import create_app
-from movie_web_app.adapters import memory_repository, database_repository
+from movie_web_app.adapters import memory_repository, database_repository, poster_cache, image_store
+from movie_web_app.adapters.omdb import OmdbException
 from movie_web_app.adapters.orm import metadata, map_model_to_tables
 from movie_web_app.adapters.memory_repository import MemoryRepository
 
@@ -77,16 +78,46 @@ def session_factory():
     metadata.drop_all(engine)
     clear_mappers()
 
+class StubPosterFetcher:
+    # Stands in for OMDb, so that tests never depend on reaching it. Titles without a poster here fail to resolve, as
+    # if OMDb were unreachable.
+    def __init__(self, posters):
+        self.posters = posters
+
+    def __call__(self, title):
+        if title not in self.posters:
+            raise OmdbException('OMDb is not reachable from tests')
+        return self.posters[title]
+
+
+def failing_image_downloader(url):
+    # Stands in for the poster image hosts, which tests don't reach either.
+    raise image_store.ImageDownloadException('{} is not reachable from tests'.format(url))
+
+
 @pytest.fixture
-def client():
-    my_app = create_app({
+def app_config():
+    return {
         'TESTING': True,                                # Set to True during testing.
         'REPOSITORY': 'memory',                         # Set to 'memory' or 'database' depending on desired repository.
         'TEST_DATA_PATH': TEST_DATA_PATH_MEMORY,        # Path for loading test data into the repository.
-        'WTF_CSRF_ENABLED': False                       # test_client will not send a CSRF token, so disable validation.
-    })
+        'WTF_CSRF_ENABLED': False,                      # test_client will not send a CSRF token, so disable validation.
+        'POSTER_CACHE_PATH': None,                      # Keep poster lookups in memory only.
+        'POSTER_IMAGE_PATH': None                       # Don't cache poster images on disk.
+    }
 
-    return my_app.test_client()
+@pytest.fixture
+def client(app_config, tmp_path):
+    my_app = create_app(app_config)
+    poster_cache.close_instance()
+    poster_cache.cache_instance = poster_cache.PosterCache(StubPosterFetcher({
+        'Guardians of the Galaxy': 'http://posters/guardians_of_the_galaxy.jpg'
+    }))
+    image_store.store_instance = image_store.ImageStore(str(tmp_path / 'poster_images'),
+                                                        downloader=failing_image_downloader)
+
+    yield my_app.test_client()
+    poster_cache.close_instance()
 
 
 class AuthenticationManager:
@@ -2,6 +2,14 @@ import pytest
 
 from flask import session
 
+import movie_web_app.adapters.repository as repo
+import movie_web_app.adapters.image_store as image_store
+import movie_web_app.utilities.page_cache as page_cache
+import movie_web_app.utilities.utilities as utilities
+import movie_web_app.movies.services as movies_services
+from movie_web_app import create_app
+from movie_web_app.domain.model import Movie, make_review
+
 def test_register(client):
     response_code = client.get('/authentication/register').status_code
     assert response_code == 200
@@ -151,8 +159,185 @@ def test_movies_in_sidebar(client):
     assert b'Ridley Scott' in response.data
 
 
+def test_last_movie_links_to_itself(client):
+    response = client.get('/movies_by_rank?rank=1000')
+    assert response.status_code == 200
+
+    assert b'href="/movies_by_rank?rank=1000"' in response.data
+
+
+def test_navigation_urls_are_generated_on_demand(client):
+    with client.application.test_request_context():
+        rank_urls = utilities.get_rank_and_url()
+        assert len(rank_urls) == 1000
+        assert rank_urls[3] == '/movies_by_rank?rank=3'
+        assert rank_urls.get(5000) is None
+
+        genre_urls = utilities.get_genres_and_urls()
+        assert genre_urls['Sci-Fi'] == '/movies_by_genre?genre=Sci-Fi'
+
+
+def test_navigation_is_reused_until_the_catalog_changes(client):
+    with client.application.test_request_context():
+        year_urls = utilities.get_years_and_urls()
+        assert utilities.get_years_and_urls() is year_urls
+
+        movie = Movie('Tenet', 2020)
+        movie.rank = 1001
+        repo.repo_instance.add_movie(movie)
+        repo.repo_instance.add_release_year(2020)
+
+        year_urls = utilities.get_years_and_urls()
+        assert 2020 in year_urls
+        assert utilities.get_years_and_urls() is year_urls
+
+
+def test_sidebar_and_navigation_are_rendered_once(client):
+    client.get('/')
+    response = client.get('/movies_by_year?release_year=2010')
+
+    assert b'Top 10 Movies!' in response.data
+    assert b'href="/movies_by_rank?rank=1"' in response.data
+    assert b'href="/movies_by_genre?genre=Horror"' in response.data
+
+    fragments = client.get('/stats').get_json()['fragments']
+    assert fragments['entries'] == 2
+    assert fragments['hits'] == 2
+
+
+def test_anonymous_pages_are_cached(client):
+    first_response = client.get('/movies_by_genre?genre=Horror')
+    second_response = client.get('/movies_by_genre?genre=Horror')
+    assert second_response.data == first_response.data
+
+    pages = client.get('/stats').get_json()['pages']
+    assert pages['entries'] == 1
+    assert pages['hits'] == 1
+    assert pages['hit_ratio'] == 0.5
+
+
+def test_review_invalidates_cached_pages_showing_the_movie(client, auth):
+    client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+    client.get('/movies_by_rank?rank=3')
+
+    auth.login()
+    client.post('/review', data={'review': 'Who needs quarantine?', 'movie_rank': 2, 'rating': 8})
+    client.get('/authentication/logout')
+
+    response = client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+    assert b'Who needs quarantine?' in response.data
+
+    pages = client.get('/stats').get_json()['pages']
+    assert pages['invalidations'] == 1
+    assert pages['entries'] == 2
+
+
+def test_page_rendered_while_a_review_is_added_is_not_cached(client, monkeypatch):
+    show_movies = utilities.show_movies
+
+    def show_movies_then_review(movies):
+        # The review arrives after the page has read the movie's reviews, but before the page is cached.
+        show_movies(movies)
+        monkeypatch.setattr(utilities, 'show_movies', show_movies)
+        movies_services.add_review(2, 'Who needs quarantine?', 8, 'thorke', repo.repo_instance)
+
+    monkeypatch.setattr(utilities, 'show_movies', show_movies_then_review)
+    response = client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+    assert b'Who needs quarantine?' not in response.data
+    assert page_cache.cache_instance.stats['entries'] == 0
+
+    response = client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+    assert b'Who needs quarantine?' in response.data
+
+
+def test_review_from_another_process_invalidates_cached_pages_with_a_database(client, auth):
+    client.application.config['REPOSITORY'] = 'database'
+    client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+
+    # A review added straight to the repository, as by another process sharing the database, doesn't drop pages from
+    # this process's cache movie by movie.
+    user = repo.repo_instance.get_user('thorke')
+    movie = repo.repo_instance.get_movie(2)
+    repo.repo_instance.add_review(make_review('Who needs quarantine?', user, movie, 8))
+
+    response = client.get('/movies_by_rank?rank=2&view_reviews_for=2')
+    assert b'Who needs quarantine?' in response.data
+    assert page_cache.cache_instance.stats['invalidations'] == 0
+
+
+def test_pages_of_logged_in_users_are_not_cached(client, auth):
+    auth.login()
+    response = client.get('/movies_by_rank?rank=1')
+    assert b'thorke' in response.data
+
+    assert page_cache.cache_instance.stats['entries'] == 0
+
+
+def test_page_cache_is_bounded_in_bytes(client):
+    page_cache.cache_instance = page_cache.PageCache(max_bytes=len(client.get('/').data) * 3 // 2)
+
+    client.get('/movies_by_rank?rank=1')
+    client.get('/movies_by_rank?rank=2')
+
+    stats = page_cache.cache_instance.stats
+    assert stats['entries'] == 1
+    assert stats['evictions'] == 1
+    assert stats['bytes'] <= stats['max_bytes']
+
+
+def test_repeat_visit_is_answered_with_not_modified(client):
+    response = client.get('/movies_by_year?release_year=2014')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    response = client.get('/movies_by_year?release_year=2014', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    # The 304 is decided before the page cache is consulted.
+    assert page_cache.cache_instance.stats['hits'] == 0
+
+
+def test_review_changes_the_etag(client, auth):
+    etag = client.get('/movies_by_rank?rank=2').headers['ETag']
+
+    auth.login()
+    client.post('/review', data={'review': 'Who needs quarantine?', 'movie_rank': 2, 'rating': 8})
+    client.get('/authentication/logout')
+
+    response = client.get('/movies_by_rank?rank=2', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_etag_depends_on_the_user(client, auth):
+    etag = client.get('/').headers['ETag']
+
+    auth.login()
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'private' in response.headers['Cache-Control']
+
+
+def test_etag_changes_with_the_deployed_application(client, monkeypatch, tmp_path):
+    etag = client.get('/').headers['ETag']
+
+    # A new deployment, whose templates render the same catalog differently.
+    (tmp_path / 'home.html').write_text('<h1>Movies</h1>')
+    version = utilities.get_application_version(str(tmp_path))
+    (tmp_path / 'home.html').write_text('<h1>All movies</h1>')
+    assert utilities.get_application_version(str(tmp_path)) != version
+
+    monkeypatch.setattr(utilities, 'application_version', version)
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
 def test_search_with_actor(client):
-    response = client.get('/movies_by_search?q=Chris+Pratt')
+    # Every movie with Chris Pratt is found, most relevant first, which puts Jurassic World on the third page.
+    response = client.get('/movies_by_search?q=Chris+Pratt&cursor=4')
     assert response.status_code == 200
 
     assert b'Search result: Chris Pratt' in response.data
@@ -177,8 +362,157 @@ def test_search_with_release_year_second_page(client):
     assert b'Kingsman: The Secret Service' in response.data
 
 
+def test_search_is_case_insensitive_and_matches_descriptions(client):
+    response = client.get('/movies_by_search?q=galaxy+criminals')
+    assert response.status_code == 200
+
+    assert b'Guardians of the Galaxy' in response.data
+
+
+def test_search_ranks_title_matches_first(client):
+    response = client.get('/movies_by_search?q=dark')
+    assert response.status_code == 200
+
+    assert b'Dark Shadows' in response.data
+    assert b'Dark Places' in response.data
+    assert b"location.href='/movies_by_search?q=dark&amp;cursor=18'" in response.data
+
+
+def test_search_tolerates_misspelled_names(client):
+    response = client.get('/movies_by_search?q=Leonardo+DiCapro')
+    assert response.status_code == 200
+
+    assert b'Inception' in response.data
+    assert b'Search result: Not Found' not in response.data
+
+
+def test_autocomplete(client):
+    response = client.get('/autocomplete?q=Jurass')
+    assert response.status_code == 200
+
+    completions = response.get_json()['completions']
+    assert completions[0] == {
+        'label': 'Jurassic World', 'kind': 'title', 'rank': 86, 'url': '/movies_by_rank?rank=86'
+    }
+
+    completions = client.get('/autocomplete?q=chris+pr').get_json()['completions']
+    assert completions[0]['url'] == '/movies_by_search?q=Chris+Pratt'
+
+
+def test_search_results_are_cached_across_pages(client):
+    client.get('/movies_by_search?q=2014')
+    client.get('/movies_by_search?q=2014&cursor=2')
+
+    searches = client.get('/stats').get_json()['searches']
+    assert searches['entries'] == 1
+    assert searches['hits'] == 1
+    assert searches['bytes'] > 0
+
+
+def test_movies_by_filter(client):
+    response = client.get('/movies_by_filter?release_year=2014&actor=Chris+Pratt')
+    assert response.status_code == 200
+
+    assert b'Movies with 2014, Chris Pratt' in response.data
+    assert b'Guardians of the Galaxy' in response.data
+    assert b'The Lego Movie' in response.data
+    assert b"location.href='/movies_by_filter?release_year=2014&amp;actor=Chris+Pratt&amp;genre=Animation'" \
+           in response.data
+
+
+def test_movies_by_filter_ignores_a_release_year_that_is_not_a_number(client):
+    response = client.get('/movies_by_filter?release_year=abc&actor=Chris+Pratt')
+    assert response.status_code == 200
+
+    assert b'Movies with Chris Pratt' in response.data
+    assert b'Guardians of the Galaxy' in response.data
+
+
+def test_movies_by_range(client):
+    response = client.get('/movies_by_range?min_runtime=90&max_runtime=120&min_rating=8.5')
+    assert response.status_code == 200
+
+    assert b'Movies with Runtime 90 to 120, Rating from 8.5' in response.data
+    assert b'movies, rated 8.5 to' in response.data
+    assert b'Rating: 8.' in response.data
+    assert b"location.href='/movies_by_range?cursor=2&amp;min_runtime=90&amp;max_runtime=120&amp;min_rating=8.5'" \
+           in response.data
+
+
+def test_movies_by_order(client):
+    response = client.get('/movies_by_order?sort=rating')
+    assert response.status_code == 200
+
+    assert b'Movies by rating, highest first' in response.data
+    assert b'The Dark Knight' in response.data
+    assert b"location.href='/movies_by_order?sort=rating&amp;order=desc&amp;cursor=2'" in response.data
+    assert b"location.href='/movies_by_order?sort=rating&amp;order=asc'" in response.data
+
+    response = client.get('/movies_by_order?sort=revenue&order=asc')
+    assert b'Movies by revenue, lowest first' in response.data
+    assert b'872 movies with a known revenue' in response.data
+
+
+def test_movies_by_order_with_a_cursor_out_of_range(client):
+    for order in ['desc', 'asc']:
+        response = client.get('/movies_by_order?sort=rating&order={}&cursor=-2'.format(order))
+        assert response.status_code == 200
+        assert response.data == client.get('/movies_by_order?sort=rating&order={}'.format(order)).data
+
+        response = client.get('/movies_by_order?sort=rating&order={}&cursor=5000'.format(order))
+        assert response.status_code == 200
+
+
 def test_search_with_unknown_result(client):
     response = client.get('/movies_by_search?q=Big')
     assert response.status_code == 200
 
     assert b'Search result: Not Found'
+
+
+def test_movies_page_defers_posters(client):
+    response = client.get('/movies_by_rank?rank=2')
+    assert b'/posters/2' in response.data
+
+
+def test_poster_redirects_to_placeholder_until_resolved(client):
+    # The stubbed OMDb fails every lookup of this title, so the poster never resolves.
+    response = client.get('/posters/2')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/static/images/poster_placeholder.svg')
+    assert 'max-age=60' in response.headers['Cache-Control']
+
+
+def test_poster_image_falls_back_to_placeholder(client):
+    response = client.get('/posters/2/image')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+
+
+def test_poster_image_falls_back_to_placeholder_when_download_fails(client):
+    # The poster resolves, but the stubbed image host can't be reached.
+    response = client.get('/posters/1/image')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/svg+xml'
+    assert 'max-age=60' in response.headers['Cache-Control']
+
+
+def test_poster_image_store_defaults_its_disk_budget(app_config, tmp_path):
+    app_config.update({'POSTER_IMAGE_PATH': str(tmp_path), 'POSTER_IMAGE_MAX_BYTES': None})
+    create_app(app_config)
+
+    assert image_store.store_instance.stats['max_bytes'] == image_store.DEFAULT_MAX_BYTES
+
+
+def test_poster_for_non_existent_movie(client):
+    response = client.get('/posters/5000')
+    assert response.status_code == 404
+
+
+def test_stats(client):
+    response = client.get('/stats')
+    assert response.status_code == 200
+
+    stats = response.get_json()
+    assert 'memory_hits' in stats['posters']
+    assert 'latency_seconds' in stats['omdb']
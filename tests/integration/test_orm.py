@@ -2,8 +2,12 @@ import pytest
 
 import datetime
 
+from sqlalchemy import create_engine
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
 
+from movie_web_app.adapters.database_repository import SqlAlchemyRepository
+from movie_web_app.adapters.orm import upgrade_schema
 from movie_web_app.domain.model import Movie, Director, Actor, Genre, User, Review, WatchList, make_review
 
 
@@ -138,3 +142,239 @@ def test_loading_of_users(empty_session):
         User("Cindy", "999")
     ]
     assert empty_session.query(User).all() == expected
+
+
+def insert_searchable_movies(empty_session):
+    empty_session.execute(
+        'INSERT INTO movies (rank, release_year, title, description) VALUES '
+        '(1, 2014, "Guardians of the Galaxy", "A group of intergalactic criminals are forced to work together."), '
+        '(2, 2012, "Prometheus", "Following clues to the origin of mankind, a team finds a structure on a moon.")'
+    )
+    director_keys = insert_directors(empty_session)
+    actor_keys = insert_actors(empty_session)
+    empty_session.execute('INSERT INTO movie_director (movie_id, director_id) VALUES (1, :gunn), (2, :scott)',
+                          {'gunn': director_keys[0], 'scott': director_keys[1]})
+    empty_session.execute('INSERT INTO movie_actors (movie_id, actor_id) VALUES (1, :pratt), (1, :diesel), '
+                          '(2, :rapace)', {'pratt': actor_keys[0], 'diesel': actor_keys[1], 'rapace': actor_keys[2]})
+    empty_session.commit()
+
+
+def test_full_text_index_follows_movies_and_people(empty_session):
+    insert_searchable_movies(empty_session)
+
+    rows = empty_session.execute('SELECT rowid FROM movies_fts WHERE movies_fts MATCH \'"chris" "pratt"\'').fetchall()
+    assert rows == [(1,)]
+    rows = empty_session.execute('SELECT rowid FROM movies_fts WHERE movies_fts MATCH \'"ridley"\'').fetchall()
+    assert rows == [(2,)]
+
+    empty_session.execute('DELETE FROM movies WHERE rank = 2')
+    rows = empty_session.execute('SELECT rowid FROM movies_fts WHERE movies_fts MATCH \'"ridley"\'').fetchall()
+    assert rows == []
+
+
+def test_repository_versions_follow_changes_made_by_other_processes(empty_session):
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+    catalog_version, review_version = repo.get_catalog_version(), repo.get_review_version()
+
+    # Changes written straight to the database, as by another process sharing it.
+    insert_searchable_movies(empty_session)
+    assert repo.get_catalog_version() != catalog_version
+    assert repo.get_review_version() == review_version
+    assert repo.search_similar_movies('Prometheus') == ([2], 1)
+
+    catalog_version = repo.get_catalog_version()
+    empty_session.execute('UPDATE movies SET title = "Alien: Covenant" WHERE rank = 2')
+    empty_session.commit()
+    assert repo.get_catalog_version() != catalog_version
+    assert repo.search_similar_movies('Alien Covenant') == ([2], 1)
+
+    catalog_version = repo.get_catalog_version()
+    user_key = insert_user(empty_session)
+    empty_session.execute(
+        'INSERT INTO reviews (user_id, movie_id, review, rating, timestamp) VALUES '
+        '(:user_id, 1, "Review 1", 8, :timestamp)',
+        {'user_id': user_key, 'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    )
+    empty_session.commit()
+    assert repo.get_review_version() != review_version
+    assert repo.get_catalog_version() == catalog_version
+
+
+def test_repository_searches_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.search_movies('Chris Pratt') == ([1], 1)
+    assert repo.search_movies('2014 galaxy') == ([1], 1)
+    movie_ranks, number_of_results = repo.search_movies('a')
+    assert sorted(movie_ranks) == [1, 2]
+    assert repo.search_movies('a', limit=1, offset=1) == (movie_ranks[1:], 2)
+    assert repo.search_movies('xyzzy') == ([], 0)
+
+
+def test_repository_finds_similar_names_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.search_similar_movies('Ridly Scot') == ([2], 1)
+    assert repo.search_similar_movies('Gardians of the Galaxi') == ([1], 1)
+
+
+def test_repository_completes_names_from_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.execute('UPDATE movies SET votes = 757074 WHERE rank = 1')
+    empty_session.execute('UPDATE movies SET votes = 485820 WHERE rank = 2')
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.get_completions('guard') == [('Guardians of the Galaxy', 'title', 1)]
+    assert repo.get_completions('r', 2) == [('Ridley Scott', 'director', None), ('Noomi Rapace', 'actor', None)]
+
+
+def test_repository_filters_movies_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    genre_keys = insert_genres(empty_session)
+    empty_session.execute('INSERT INTO movie_genres (movie_id, genre_id) VALUES (1, :action), (1, :adventure), '
+                          '(2, :adventure)', {'action': genre_keys[0], 'adventure': genre_keys[1]})
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    movie_ranks, facet_counts = repo.filter_movies(genre='Adventure')
+    assert movie_ranks == [1, 2]
+    assert facet_counts['release_year'] == [(2012, 1), (2014, 1)]
+    assert facet_counts['director'] == [('James Gunn', 1), ('Ridley Scott', 1)]
+
+    movie_ranks, facet_counts = repo.filter_movies(genre='Adventure', actor='Chris Pratt')
+    assert movie_ranks == [1]
+    assert facet_counts == {'release_year': [(2014, 1)], 'director': [('James Gunn', 1)]}
+
+
+def test_repository_retrieves_reviews_by_movie_and_by_user(empty_session):
+    insert_searchable_movies(empty_session)
+    user_key = insert_user(empty_session)
+    empty_session.execute(
+        'INSERT INTO reviews (user_id, movie_id, review, rating, timestamp) VALUES '
+        '(:user_id, 1, "Review 1", 8, :timestamp), (:user_id, 2, "Review 2", 7, :timestamp), '
+        '(:user_id, 1, "Review 3", 6, :timestamp)',
+        {'user_id': user_key, 'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    )
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert len(repo.get_reviews_for_movie(1)) == 2
+    assert len(repo.get_reviews_for_user('Andrew')) == 3
+    assert repo.get_reviews_for_movie(3) == []
+    assert repo.get_reviews_for_user('nobody') == []
+
+
+def test_repository_answers_year_range_queries_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.get_years_in_range(2013, 2014) == [2014]
+    assert repo.get_years_in_range() == [2012, 2014]
+    assert repo.get_movies_with_years_in_range(first_year=2012) == [1, 2]
+    assert repo.get_movies_with_years_in_range(last_year=2013) == [2]
+
+
+def test_repository_filters_movies_on_numeric_ranges_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.execute('UPDATE movies SET runtime = 121, rating = 8.1, revenue = 333.13 WHERE rank = 1')
+    empty_session.execute('UPDATE movies SET runtime = 124, rating = 7.0 WHERE rank = 2')
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.get_movies_in_ranges({'runtime': (120, 125)}) == [1, 2]
+    assert repo.get_movies_in_ranges({'runtime': (120, 125), 'rating': (7.5, None)}) == [1]
+    assert repo.get_movies_in_ranges({'revenue': (None, None)}) == [1]
+    assert repo.get_movies_in_ranges({'release_year': (None, 2013)}) == [2]
+
+
+def test_repository_summarises_attributes_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.execute('UPDATE movies SET rating = 8.1, revenue = 333.13 WHERE rank = 1')
+    empty_session.execute('UPDATE movies SET rating = 7.0 WHERE rank = 2')
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    statistics = repo.get_movie_statistics('rating')
+    assert (statistics['count'], statistics['minimum'], statistics['maximum']) == (2, 7.0, 8.1)
+    assert repo.get_movie_statistics('revenue', [2])['count'] == 0
+    assert repo.get_movie_statistics('revenue', [1, 2])['mean'] == 333.13
+
+
+def test_repository_pages_through_movies_in_sorted_order_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.execute('UPDATE movies SET rating = 8.1, revenue = 333.13 WHERE rank = 1')
+    empty_session.execute('UPDATE movies SET rating = 7.0 WHERE rank = 2')
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.get_movies_sorted_by('rating') == ([1, 2], 2)
+    assert repo.get_movies_sorted_by('rating', 1, 1, descending=False) == ([1], 2)
+    assert repo.get_movies_sorted_by('revenue') == ([1], 1)
+
+
+def test_repository_lists_tied_movies_in_order_of_rank_in_the_database(empty_session):
+    insert_searchable_movies(empty_session)
+    empty_session.execute('UPDATE movies SET rating = 8.1')
+    empty_session.commit()
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    assert repo.get_movies_sorted_by('rating') == ([1, 2], 2)
+    assert repo.get_movies_sorted_by('rating', descending=False) == ([1, 2], 2)
+    assert repo.get_movies_sorted_by('rating', -2, 1) == ([1], 2)
+    assert repo.get_movies_sorted_by('rating', 5, 1, descending=False) == ([], 2)
+
+
+# The schema of a database created before the full-text index, the numeric movie columns and the versions table.
+PRE_UPGRADE_SCHEMA = [
+    'CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(255) NOT NULL UNIQUE, password VARCHAR(255) NOT NULL)',
+    'CREATE TABLE movies (rank INTEGER PRIMARY KEY, release_year INTEGER NOT NULL, title VARCHAR(255) NOT NULL, '
+    'description VARCHAR(1024) NOT NULL)',
+    'CREATE TABLE reviews (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), '
+    'movie_id INTEGER REFERENCES movies (rank), review VARCHAR(1024) NOT NULL, rating INTEGER NOT NULL, '
+    'timestamp DATETIME NOT NULL)',
+    'CREATE TABLE release_year (year INTEGER PRIMARY KEY)',
+    'CREATE TABLE movie_year (id INTEGER PRIMARY KEY, movie_id INTEGER REFERENCES movies (rank), '
+    'year INTEGER REFERENCES release_year (year))',
+    'CREATE TABLE directors (id INTEGER PRIMARY KEY, name VARCHAR(64) NOT NULL)',
+    'CREATE TABLE movie_director (id INTEGER PRIMARY KEY, movie_id INTEGER REFERENCES movies (rank), '
+    'director_id INTEGER REFERENCES directors (id))',
+    'CREATE TABLE actors (id INTEGER PRIMARY KEY, name VARCHAR(64) NOT NULL)',
+    'CREATE TABLE movie_actors (id INTEGER PRIMARY KEY, movie_id INTEGER REFERENCES movies (rank), '
+    'actor_id INTEGER REFERENCES actors (id))',
+    'CREATE TABLE genres (id INTEGER PRIMARY KEY, name VARCHAR(64) NOT NULL)',
+    'CREATE TABLE movie_genres (id INTEGER PRIMARY KEY, movie_id INTEGER REFERENCES movies (rank), '
+    'genre_id INTEGER REFERENCES genres (id))',
+    'INSERT INTO movies (rank, release_year, title, description) VALUES '
+    '(1, 2014, "Guardians of the Galaxy", "A group of intergalactic criminals are forced to work together."), '
+    '(2, 2012, "Prometheus", "Following clues to the origin of mankind, a team finds a structure on a moon.")',
+    'INSERT INTO actors (id, name) VALUES (1, "Chris Pratt"), (2, "Noomi Rapace")',
+    'INSERT INTO movie_actors (movie_id, actor_id) VALUES (1, 1), (2, 2)',
+]
+
+
+def test_upgrade_brings_an_earlier_database_up_to_date(tmp_path):
+    engine = create_engine('sqlite:///{}'.format(tmp_path / 'movies.db'))
+    for statement in PRE_UPGRADE_SCHEMA:
+        engine.execute(statement)
+
+    upgrade_schema(engine)
+    # Upgrading is idempotent, so it can run on every start.
+    upgrade_schema(engine)
+    repo = SqlAlchemyRepository(sessionmaker(bind=engine))
+
+    # Movies stored before the upgrade are searchable.
+    assert repo.search_movies('Chris Pratt') == ([1], 1)
+    assert repo.get_movies_sorted_by('rating') == ([], 0)
+
+    # Changes after the upgrade reach the full-text index, the new columns and the versions.
+    catalog_version = repo.get_catalog_version()
+    engine.execute('INSERT INTO movies (rank, release_year, title, description, rating) VALUES '
+                   '(3, 2016, "Split", "Three girls are kidnapped by a man with 23 personalities.", 7.3)')
+    assert repo.get_catalog_version() != catalog_version
+    assert repo.search_movies('kidnapped') == ([3], 1)
+    assert repo.get_movies_sorted_by('rating') == ([3], 1)
+    engine.dispose()
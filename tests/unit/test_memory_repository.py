@@ -117,3 +117,346 @@ def test_repository_can_retrieve_reviews(in_memory_repo):
 def test_repository_return_all_movies(in_memory_repo):
     movies = in_memory_repo.all_movies()
     assert len(movies) == 1000
+
+
+def test_repository_catalog_version_changes_only_when_movies_are_added(in_memory_repo):
+    version = in_memory_repo.get_catalog_version()
+
+    user = in_memory_repo.get_user('thorke')
+    review = make_review("Great fun", user, in_memory_repo.get_movie(2), 8)
+    in_memory_repo.add_review(review)
+    assert in_memory_repo.get_catalog_version() == version
+
+    movie = Movie('Tenet', 2020)
+    movie.rank = 1001
+    in_memory_repo.add_movie(movie)
+    assert in_memory_repo.get_catalog_version() != version
+
+
+def test_repository_review_version_changes_when_reviews_are_added(in_memory_repo):
+    version = in_memory_repo.get_review_version()
+
+    user = in_memory_repo.get_user('thorke')
+    review = make_review("Great fun", user, in_memory_repo.get_movie(2), 8)
+    in_memory_repo.add_review(review)
+    assert in_memory_repo.get_review_version() != version
+
+
+def test_repository_search_matches_every_word_of_the_query(in_memory_repo):
+    ranks, number_of_results = in_memory_repo.search_movies('chris PRATT')
+    assert number_of_results == len(ranks) == 7
+
+    titles = [movie.title for movie in in_memory_repo.get_movies_by_rank(ranks)]
+    assert 'Guardians of the Galaxy' in titles
+    assert 'Jurassic World' in titles
+
+    assert in_memory_repo.search_movies('Chris Pratt Jurassic') == ([86], 1)
+
+
+def test_repository_search_returns_the_best_matches_first(in_memory_repo):
+    ranks, number_of_results = in_memory_repo.search_movies('dark', limit=2)
+    assert number_of_results == 19
+
+    # Short titles containing the word come before longer ones, and before matches in descriptions.
+    titles = [movie.title for movie in in_memory_repo.get_movies_by_rank(ranks)]
+    assert titles == ['Dark Shadows', 'Dark Places']
+
+
+def test_repository_search_with_no_matches(in_memory_repo):
+    assert in_memory_repo.search_movies('Pratt xyzzy') == ([], 0)
+    assert in_memory_repo.search_movies('  ') == ([], 0)
+
+
+def test_repository_search_includes_movies_added_later(in_memory_repo):
+    movie = Movie('Tenet', 2020)
+    movie.rank = 1001
+    movie.description = 'Armed with only one word, Tenet, a protagonist journeys through a twilight world.'
+    in_memory_repo.add_movie(movie)
+
+    assert in_memory_repo.search_movies('tenet 2020') == ([1001], 1)
+
+
+def test_repository_finds_movies_with_similarly_spelled_names(in_memory_repo):
+    ranks, number_of_results = in_memory_repo.search_similar_movies('Jurasic Wrld')
+    assert ranks == [86]
+
+    # The movies of the closest name come first.
+    ranks, number_of_results = in_memory_repo.search_similar_movies('Chris Prat', limit=7)
+    assert number_of_results > 7
+    assert sorted(ranks) == sorted(in_memory_repo.search_movies('Chris Pratt')[0])
+
+
+def test_repository_similar_search_with_no_matches(in_memory_repo):
+    assert in_memory_repo.search_similar_movies('xyzzy') == ([], 0)
+
+
+def test_repository_completes_titles_and_names_by_popularity(in_memory_repo):
+    completions = in_memory_repo.get_completions('dark kn', 2)
+    assert completions == [('The Dark Knight', 'title', 55), ('The Dark Knight Rises', 'title', 125)]
+
+    labels = [label for label, kind, rank in in_memory_repo.get_completions('chris', 20)]
+    assert 'Christopher Nolan' in labels
+    assert 'Chris Pratt' in labels
+
+
+def test_repository_completions_include_movies_added_later(in_memory_repo):
+    # Completed once before the movie is added, so that a stale completion would be remembered.
+    assert in_memory_repo.get_completions('te', 1) != [('Tenet', 'title', 1001)]
+
+    movie = Movie('Tenet', 2020)
+    movie.rank = 1001
+    movie.votes = 10 ** 7
+    in_memory_repo.add_movie(movie)
+
+    assert in_memory_repo.get_completions('te', 1) == [('Tenet', 'title', 1001)]
+
+
+def test_repository_filters_movies_on_several_facets(in_memory_repo):
+    movie_ranks, facet_counts = in_memory_repo.filter_movies(release_year=2014, genre='Sci-Fi', actor='Chris Pratt')
+    assert movie_ranks == [1]
+    assert set(facet_counts) == {'director'}
+    assert facet_counts['director'] == [('James Gunn', 1)]
+
+
+def test_repository_counts_facets_of_the_remaining_dimensions(in_memory_repo):
+    movie_ranks, facet_counts = in_memory_repo.filter_movies(director='Christopher Nolan', facet_limit=3)
+    assert movie_ranks == sorted(movie_ranks)
+    assert len(movie_ranks) == 5
+
+    assert set(facet_counts) == {'release_year', 'genre', 'actor'}
+    assert facet_counts['actor'] == [('Christian Bale', 3), ('Anne Hathaway', 2), ('Michael Caine', 2)]
+    assert len(facet_counts['genre']) == 3
+    assert sum(count for year, count in in_memory_repo.filter_movies(director='Christopher Nolan')[1]['release_year']) == 5
+
+
+def test_repository_filter_without_matches(in_memory_repo):
+    movie_ranks, facet_counts = in_memory_repo.filter_movies(release_year=2014, actor='Nobody')
+    assert movie_ranks == []
+    assert facet_counts == {'genre': [], 'director': []}
+
+
+def test_repository_indexes_actors_by_name(in_memory_repo):
+    assert in_memory_repo.get_movie_with_given_actor('Vin Diesel')[0] == 1
+    assert 'Vin Diesel' in in_memory_repo.get_movie(1).actors
+
+
+def test_repository_filters_movies_on_year_and_genre_bitsets(in_memory_repo):
+    movie_ranks, facet_counts = in_memory_repo.filter_movies(release_year=2016, genre='Drama', facet_limit=1000)
+    expected = [rank for rank in in_memory_repo.get_movie_with_given_year(2016)
+                if 'Drama' in in_memory_repo.get_movie(rank).genres]
+    assert movie_ranks == expected
+
+    assert set(facet_counts) == {'director', 'actor'}
+    assert sum(count for director, count in facet_counts['director']) == len(movie_ranks)
+
+
+def test_repository_counts_facets_of_the_whole_catalog(in_memory_repo):
+    movie_ranks, facet_counts = in_memory_repo.filter_movies(facet_limit=1000)
+    assert len(movie_ranks) == 1000
+    assert dict(facet_counts['release_year'])[2016] == len(in_memory_repo.get_movie_with_given_year(2016))
+    assert dict(facet_counts['genre'])['Drama'] == len(in_memory_repo.get_movie_with_given_genre('Drama'))
+    assert sum(count for year, count in facet_counts['release_year']) == 1000
+
+
+def test_bitset_index_and_or_and_count():
+    from movie_web_app.adapters.bitset_index import BitsetIndex, count, to_ranks, contains
+
+    index = BitsetIndex()
+    for rank, value in [(1, 'a'), (5, 'a'), (64, 'a'), (5, 'b'), (900, 'b')]:
+        index.add(value, rank)
+
+    assert to_ranks(index.get('a')) == [1, 5, 64]
+    assert to_ranks(index.get('a') & index.get('b')) == [5]
+    assert to_ranks(index.get('a') | index.get('b')) == [1, 5, 64, 900]
+    assert count(index.get('a') | index.get('b')) == 4
+    assert contains(index.get('b'), 900) and not contains(index.get('b'), 64)
+    assert index.get('c') == 0 and 'c' not in index and len(index) == 2
+
+    index.add('b', 2)
+    assert to_ranks(index.get('b')) == [2, 5, 900]
+
+
+def test_repository_indexes_reviews_by_movie_and_by_user(in_memory_repo):
+    user = in_memory_repo.get_user('thorke')
+    first_review = make_review("Great fun", user, in_memory_repo.get_movie(2), 8)
+    in_memory_repo.add_review(first_review)
+    second_review = make_review("Too long", user, in_memory_repo.get_movie(3), 4)
+    in_memory_repo.add_review(second_review)
+
+    assert in_memory_repo.get_reviews_for_movie(2) == [first_review]
+    assert in_memory_repo.get_reviews_for_movie(4) == []
+    assert in_memory_repo.get_reviews_for_user('thorke') == [first_review, second_review]
+    assert in_memory_repo.get_reviews_for_user('prince') == []
+
+    assert in_memory_repo.have_review(first_review)
+    assert not in_memory_repo.have_review(make_review("Great fun", user, in_memory_repo.get_movie(4), 8))
+
+
+def test_repository_keeps_the_first_user_added_under_a_name(in_memory_repo):
+    user = in_memory_repo.get_user('fmercury')
+    in_memory_repo.add_user(User('fmercury', 'another password'))
+    assert in_memory_repo.get_user('fmercury') is user
+
+
+def test_repository_keeps_years_and_genres_sorted_without_duplicates(in_memory_repo):
+    in_memory_repo.add_release_year(2005)
+    in_memory_repo.add_release_year(2016)
+    assert in_memory_repo.get_year_list() == [2005] + list(range(2006, 2017))
+
+    genres = in_memory_repo.get_genre_list()
+    assert genres == sorted(set(genres))
+    assert 'Sci-Fi' in genres
+
+
+def test_repository_answers_year_range_queries(in_memory_repo):
+    assert in_memory_repo.get_years_in_range(2010, 2015) == [2010, 2011, 2012, 2013, 2014, 2015]
+    assert in_memory_repo.get_years_in_range(2015) == [2015, 2016]
+    assert in_memory_repo.get_years_in_range(last_year=2006) == [2006]
+    assert in_memory_repo.get_years_in_range(2017, 2020) == []
+
+    movie_ranks = in_memory_repo.get_movies_with_years_in_range(2015, 2016)
+    assert movie_ranks == sorted(in_memory_repo.get_movie_with_given_year(2015) +
+                                 in_memory_repo.get_movie_with_given_year(2016))
+    assert len(in_memory_repo.get_movies_with_years_in_range()) == 1000
+
+
+def test_repository_keeps_ratings_revenues_and_metascores(in_memory_repo):
+    movie = in_memory_repo.get_movie(1)
+    assert (movie.rating, movie.votes, movie.revenue, movie.metascores) == (8.1, 757074, 333.13, 76)
+
+    assert any(movie.revenue is None for movie in in_memory_repo.all_movies())
+    assert any(movie.metascores is None for movie in in_memory_repo.all_movies())
+
+
+def test_repository_filters_movies_on_numeric_ranges(in_memory_repo):
+    movie_ranks = in_memory_repo.get_movies_in_ranges(
+        {'runtime': (90, 120), 'rating': (7.5, None), 'release_year': (2010, 2014)})
+    expected = [movie.rank for movie in in_memory_repo.all_movies()
+                if 90 <= movie.runtime_minutes <= 120 and movie.rating >= 7.5 and 2010 <= movie.release_year <= 2014]
+    assert len(expected) > 0
+    assert movie_ranks == sorted(expected)
+
+    with_revenue = in_memory_repo.get_movies_in_ranges({'revenue': (None, None)})
+    assert len(with_revenue) == len([movie for movie in in_memory_repo.all_movies() if movie.revenue is not None])
+    assert in_memory_repo.get_movies_in_ranges({'rating': (9.5, None)}) == []
+    assert len(in_memory_repo.get_movies_in_ranges({})) == 1000
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_movies_in_ranges({'title': (None, None)})
+
+
+def test_range_index_orders_movies_by_value():
+    from movie_web_app.adapters.range_index import RangeIndex
+
+    index = RangeIndex()
+    for rank, value in [(1, 7.5), (2, 8.1), (3, None), (4, 7.5), (5, 6.0)]:
+        index.add(value, rank)
+
+    assert len(index) == 4
+    assert index.ranks() == [5, 1, 4, 2]
+    assert index.ranks(7.5, 7.5) == [1, 4]
+    assert index.count(7.0) == 3
+    assert index.value(3) is None
+    assert index.page(1, 2) == [1, 4]
+    assert index.page(0, 3, descending=True) == [2, 1, 4]
+    assert index.page(10, 3, descending=True) == []
+
+    # Adding a movie again moves it to its new value.
+    index.add(5.0, 2)
+    assert index.ranks() == [2, 5, 1, 4]
+    assert index.value(2) == 5.0
+
+
+def test_range_index_lists_tied_movies_in_order_of_rank_both_ways():
+    from movie_web_app.adapters.range_index import RangeIndex
+
+    ratings = {1: 8.1, 2: 7.5, 3: 8.1, 4: 6.0, 5: 7.5, 6: 8.1, 7: 7.5}
+    index = RangeIndex()
+    for rank, rating in ratings.items():
+        index.add(rating, rank)
+
+    ascending = sorted(ratings, key=lambda rank: (ratings[rank], rank))
+    descending = sorted(ratings, key=lambda rank: (-ratings[rank], rank))
+    assert index.page(descending=True) == [1, 3, 6, 2, 5, 7, 4]
+    for offset in range(len(ratings) + 1):
+        for limit in range(1, 4):
+            assert index.page(offset, limit, descending=True) == descending[offset:offset + limit]
+
+
+    # Offsets before the start begin at the first movie, and offsets past the end give an empty page.
+    assert index.page(-2, 3) == ascending[:3]
+    assert index.page(-2, 3, descending=True) == descending[:3]
+    assert index.page(len(ratings) + 5, 3) == []
+    assert index.page(len(ratings) + 5, 3, descending=True) == []
+
+
+def test_repository_summarises_attributes_from_its_columns(in_memory_repo):
+    movies = in_memory_repo.all_movies()
+    statistics = in_memory_repo.get_movie_statistics('rating')
+    assert statistics['count'] == 1000
+    assert statistics['minimum'] == min(movie.rating for movie in movies)
+    assert statistics['maximum'] == max(movie.rating for movie in movies)
+    assert statistics['mean'] == pytest.approx(sum(movie.rating for movie in movies) / 1000)
+
+    revenues = [movie.revenue for movie in movies[:10] if movie.revenue is not None]
+    statistics = in_memory_repo.get_movie_statistics('revenue', [movie.rank for movie in movies[:10]])
+    assert statistics['count'] == len(revenues)
+    assert statistics['maximum'] == max(revenues)
+
+    assert in_memory_repo.get_movie_statistics('votes', []) == {'count': 0, 'minimum': None, 'maximum': None,
+                                                               'mean': None}
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_movie_statistics('title')
+
+
+def test_repository_columns_follow_movies_added_later(in_memory_repo):
+    movie = Movie('Tenet', 2020)
+    movie.rank = 1005
+    movie.runtime_minutes = 150
+    movie.rating = 7.4
+    in_memory_repo.add_movie(movie)
+
+    assert 1005 in in_memory_repo.get_movies_in_ranges({'runtime': (150, 150), 'rating': (7.0, 8.0)})
+    assert 1005 not in in_memory_repo.get_movies_in_ranges({'runtime': (150, 150), 'rating': (8.0, None)})
+    assert 1005 in in_memory_repo.get_movies_in_ranges({'release_year': (2020, None)})
+    assert in_memory_repo.get_movie_statistics('runtime', [1005, 1003])['maximum'] == 150
+
+
+def test_column_store_marks_missing_values():
+    from movie_web_app.adapters.column_store import ColumnStore
+
+    columns = ColumnStore()
+    columns.set(3, {'rating': 8.1, 'revenue': None, 'votes': 10})
+    columns.set(1, {'rating': 6.5, 'revenue': 12.5, 'votes': 20})
+
+    assert len(columns) == 4
+    assert columns.get('revenue', 3) is None and columns.get('revenue', 1) == 12.5
+    assert columns.get('rating', 2) is None and columns.get('rating', 10) is None
+    assert columns.select([1, 2, 3], 'rating', minimum=7.0) == [3]
+    assert columns.statistics('revenue') == {'count': 1, 'minimum': 12.5, 'maximum': 12.5, 'mean': 12.5}
+    assert columns.statistics('votes', [1, 3, 7])['mean'] == 15
+
+
+def test_repository_pages_through_movies_in_sorted_order(in_memory_repo):
+    with_revenue = [movie for movie in in_memory_repo.all_movies() if movie.revenue is not None]
+    by_revenue = sorted(with_revenue, key=lambda movie: (movie.revenue, movie.rank), reverse=True)
+
+    movie_ranks, number_of_movies = in_memory_repo.get_movies_sorted_by('revenue', 10, 5)
+    assert number_of_movies == len(with_revenue)
+    assert movie_ranks == [movie.rank for movie in by_revenue[10:15]]
+
+    movie_ranks, number_of_movies = in_memory_repo.get_movies_sorted_by('runtime', descending=False)
+    runtimes = [in_memory_repo.get_movie(rank).runtime_minutes for rank in movie_ranks]
+    assert number_of_movies == 1000 and runtimes == sorted(runtimes)
+
+    with pytest.raises(RepositoryException):
+        in_memory_repo.get_movies_sorted_by('title')
+
+
+def test_repository_sorted_order_follows_movies_added_later(in_memory_repo):
+    movie = Movie('Tenet', 2020)
+    movie.rank = 1005
+    movie.votes = 10 ** 7
+    in_memory_repo.add_movie(movie)
+
+    assert in_memory_repo.get_movies_sorted_by('votes', 0, 1) == ([1005], 1001)
@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from movie_web_app import create_app
+from movie_web_app.adapters.omdb import OmdbClient, OmdbException, OmdbUnavailableException, CircuitBreaker
+from movie_web_app.adapters.image_store import ImageStore, ImageDownloadException, download_image
+from movie_web_app.adapters.poster_cache import PosterCache, PosterStore
+from movie_web_app.domain.model import Movie
+from movie_web_app.posters.services import warm_up_posters, read_checkpoint
+
+
+class StubFetcher:
+    def __init__(self, posters):
+        self.posters = posters
+        self.calls = list()
+
+    def __call__(self, title):
+        self.calls.append(title)
+        poster = self.posters[title]
+        if isinstance(poster, Exception):
+            raise poster
+        return poster
+
+
+def test_poster_cache_only_fetches_a_title_once():
+    fetcher = StubFetcher({'Split': 'http://posters/split.jpg'})
+    cache = PosterCache(fetcher)
+
+    assert cache.get_poster('Split') == 'http://posters/split.jpg'
+    assert cache.get_poster('Split') == 'http://posters/split.jpg'
+    assert fetcher.calls == ['Split']
+    assert cache.stats['memory_hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_poster_cache_remembers_unknown_titles():
+    fetcher = StubFetcher({'No Such Movie': None})
+    cache = PosterCache(fetcher)
+
+    assert cache.get_poster('No Such Movie') is None
+    assert cache.get_poster('No Such Movie') is None
+    assert fetcher.calls == ['No Such Movie']
+    assert cache.stats['negative_hits'] == 1
+
+
+def test_poster_cache_survives_lookup_failures():
+    fetcher = StubFetcher({'Split': OmdbException('timed out')})
+    cache = PosterCache(fetcher)
+
+    assert cache.get_poster('Split') is None
+    assert cache.stats['fetch_errors'] == 1
+
+
+def test_poster_cache_reads_through_to_disk(tmp_path):
+    database_path = str(tmp_path / 'posters.db')
+    fetcher = StubFetcher({'Split': 'http://posters/split.jpg', 'No Such Movie': None})
+    cache = PosterCache(fetcher, PosterStore(database_path))
+    cache.get_poster('Split')
+    cache.get_poster('No Such Movie')
+
+    # A fresh cache over the same file, as after a restart, answers without calling the fetcher.
+    restarted_fetcher = StubFetcher({})
+    restarted_cache = PosterCache(restarted_fetcher, PosterStore(database_path))
+
+    assert restarted_cache.get_posters(['Split', 'No Such Movie']) == {
+        'Split': 'http://posters/split.jpg', 'No Such Movie': None}
+    assert restarted_fetcher.calls == []
+    assert restarted_cache.stats['disk_hits'] == 2
+
+
+def test_poster_cache_close_stops_its_threads_and_store(tmp_path):
+    store = PosterStore(str(tmp_path / 'posters.db'))
+    cache = PosterCache(StubFetcher({'Split': 'http://posters/split.jpg'}), store)
+    cache.get_posters(['Split'])
+
+    cache.close()
+    assert not any(thread.name.startswith('poster-fetch') for thread in threading.enumerate())
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.get('Split')
+
+
+def test_poster_cache_close_cancels_queued_lookups(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def fetcher(title):
+        if title == 'Split':
+            started.set()
+            release.wait(timeout=10)
+        return 'http://posters/{}.jpg'.format(title)
+
+    # With one fetch thread, Sing waits in the queue while Split is being looked up.
+    cache = PosterCache(fetcher, max_workers=1)
+    posters = dict()
+    request = threading.Thread(target=lambda: posters.update(cache.get_posters(['Split', 'Sing'], deadline=10)))
+    request.start()
+    assert started.wait(timeout=10)
+
+    closing = threading.Thread(target=cache.close)
+    closing.start()
+    # Cancelling a lookup drops it from the pending lookups.
+    deadline = time.monotonic() + 10
+    while 'Sing' in cache._PosterCache__pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    closing.join(timeout=10)
+    request.join(timeout=10)
+
+    assert posters == {'Split': 'http://posters/Split.jpg', 'Sing': None}
+
+
+class StubOmdbHandler(BaseHTTPRequestHandler):
+    # Speak HTTP/1.1 so that connections are kept alive between requests.
+    protocol_version = 'HTTP/1.1'
+
+    # Titles starting with 'Slow' are only answered once a test sets release_slow.
+    release_slow = threading.Event()
+
+    def do_GET(self):
+        title = parse_qs(urlparse(self.path).query)['t'][0]
+        if title.startswith('Slow'):
+            self.release_slow.wait(timeout=10)
+        body = json.dumps({'Title': title, 'Poster': 'http://posters/{}.jpg'.format(title)}).encode('UTF-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if title.startswith('Truncated'):
+            # Drop the connection part way through the body.
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_omdb_url():
+    StubOmdbHandler.release_slow.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOmdbHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    StubOmdbHandler.release_slow.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_poster_cache_resolves_a_page_of_posters_concurrently(stub_omdb_url):
+    cache = PosterCache(OmdbClient('key', base_url=stub_omdb_url).get_poster)
+
+    posters = cache.get_posters(['Split', 'Sing', 'Moana'], deadline=5)
+
+    assert posters == {'Split': 'http://posters/Split.jpg', 'Sing': 'http://posters/Sing.jpg',
+                       'Moana': 'http://posters/Moana.jpg'}
+
+
+def test_poster_cache_falls_back_to_placeholder_after_deadline(stub_omdb_url):
+    cache = PosterCache(OmdbClient('key', base_url=stub_omdb_url).get_poster)
+
+    # The slow lookup can't finish before it is released, so the deadline has to cut the wait short.
+    posters = cache.get_posters(['Split', 'Slow Burn'], deadline=0.3)
+    assert posters == {'Split': 'http://posters/Split.jpg', 'Slow Burn': None}
+
+    # The slow lookup carries on in the background, and later requests wait on the same lookup rather than starting
+    # another one.
+    StubOmdbHandler.release_slow.set()
+    assert cache.get_posters(['Slow Burn'], deadline=10) == {'Slow Burn': 'http://posters/Slow Burn.jpg'}
+    assert cache.stats['misses'] == 2
+
+
+def test_omdb_client_reuses_connections(stub_omdb_url):
+    client = OmdbClient('key', base_url=stub_omdb_url)
+
+    assert client.get_poster('Split') == 'http://posters/Split.jpg'
+    assert client.get_poster('Sing') == 'http://posters/Sing.jpg'
+    assert client.stats['connections_opened'] == 1
+    assert client.stats['latency_seconds']['count'] == 2
+
+
+def test_omdb_client_discards_connections_that_fail_mid_response(stub_omdb_url):
+    client = OmdbClient('key', base_url=stub_omdb_url)
+
+    assert client.get_poster('Split') == 'http://posters/Split.jpg'
+    with pytest.raises(OmdbException):
+        client.get_poster('Truncated')
+    # The broken connection was closed rather than pooled, so the next call opens a fresh one.
+    assert client.get_poster('Sing') == 'http://posters/Sing.jpg'
+    assert client.stats['connections_opened'] == 3
+
+
+def test_omdb_client_stops_calling_omdb_after_repeated_failures():
+    # Nothing listens on port 9 of the loopback interface, so every call fails straight away.
+    client = OmdbClient('key', base_url='http://127.0.0.1:9/', breaker=CircuitBreaker(failure_threshold=2))
+
+    for attempt in range(2):
+        with pytest.raises(OmdbException):
+            client.get_poster('Split')
+
+    with pytest.raises(OmdbUnavailableException):
+        client.get_poster('Split')
+    assert client.stats['requests'] == 2
+    assert client.stats['rejected'] == 1
+    assert client.stats['circuit'] == 'open'
+
+
+def make_movie(rank, title):
+    movie = Movie(title, 2016)
+    movie.rank = rank
+    return movie
+
+
+def test_poster_warm_up_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / 'warm-up.json')
+    movies = [make_movie(1, 'Split'), make_movie(2, 'Sing'), make_movie(3, 'No Such Movie')]
+    fetcher = StubFetcher({'Split': 'http://posters/split.jpg', 'Sing': OmdbException('timed out'),
+                           'No Such Movie': None})
+
+    store = PosterStore(str(tmp_path / 'posters.db'))
+
+    summary = warm_up_posters(movies, PosterCache(fetcher, store), checkpoint_path=checkpoint_path, rate=0)
+
+    assert (summary['resolved'], summary['not_found'], summary['failed']) == (1, 1, 1)
+    assert read_checkpoint(checkpoint_path) == {1, 3}
+
+    # Only the failed lookup is retried on the next run.
+    fetcher = StubFetcher({'Sing': 'http://posters/sing.jpg'})
+    summary = warm_up_posters(movies, PosterCache(fetcher, store), checkpoint_path=checkpoint_path, rate=0)
+
+    assert fetcher.calls == ['Sing']
+    assert (summary['skipped'], summary['resolved'], summary['failed']) == (2, 1, 0)
+    assert read_checkpoint(checkpoint_path) == {1, 2, 3}
+
+
+def test_poster_warm_up_without_a_store_keeps_no_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / 'warm-up.json')
+    movies = [make_movie(1, 'Split'), make_movie(2, 'Sing')]
+    fetcher = StubFetcher({'Split': 'http://posters/split.jpg', 'Sing': 'http://posters/sing.jpg'})
+
+    summary = warm_up_posters(movies, PosterCache(fetcher), checkpoint_path=checkpoint_path, rate=0)
+
+    # The posters only live in memory, so a later run with a store must not skip them.
+    assert summary['resolved'] == 2
+    assert read_checkpoint(checkpoint_path) == set()
+
+
+def test_poster_warm_up_command_requires_a_poster_store(app_config):
+    app = create_app(app_config)
+
+    result = app.test_cli_runner().invoke(args=['posters', 'warm'])
+
+    assert result.exit_code != 0
+    assert 'POSTER_CACHE_PATH is not set' in result.output
+
+
+class StubDownloader:
+    def __init__(self, images):
+        self.images = images
+        self.calls = list()
+
+    def __call__(self, url):
+        self.calls.append(url)
+        return self.images[url], 'image/jpeg'
+
+
+def test_image_store_downloads_each_image_once(tmp_path):
+    downloader = StubDownloader({'http://posters/split.jpg': b'split'})
+    store = ImageStore(str(tmp_path), downloader=downloader)
+
+    path, mimetype, digest = store.get_image('http://posters/split.jpg')
+    assert store.get_image('http://posters/split.jpg') == (path, mimetype, digest)
+    assert downloader.calls == ['http://posters/split.jpg']
+    with open(path, 'rb') as image_file:
+        assert image_file.read() == b'split'
+
+
+def test_image_store_downloads_images_evicted_while_being_served(tmp_path, monkeypatch):
+    downloader = StubDownloader({'http://posters/split.jpg': b'split'})
+    store = ImageStore(str(tmp_path), downloader=downloader)
+    path = store.get_image('http://posters/split.jpg')[0]
+
+    # Evict the image between the store finding it and recording the access.
+    utime = os.utime
+
+    def evict_then_utime(evicted_path, *args, **kwargs):
+        if os.path.exists(evicted_path):
+            os.remove(evicted_path)
+        return utime(evicted_path, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'utime', evict_then_utime)
+
+    assert store.get_image('http://posters/split.jpg')[0] == path
+    assert downloader.calls == ['http://posters/split.jpg'] * 2
+    with open(path, 'rb') as image_file:
+        assert image_file.read() == b'split'
+
+
+@pytest.mark.parametrize('url', ['file:///etc/passwd', 'ftp://posters/split.jpg', '/posters/split.jpg'])
+def test_download_image_only_fetches_web_urls(url):
+    with pytest.raises(ImageDownloadException):
+        download_image(url)
+
+
+def test_image_store_stores_identical_images_once(tmp_path):
+    downloader = StubDownloader({'http://posters/a.jpg': b'same', 'http://posters/b.jpg': b'same'})
+    store = ImageStore(str(tmp_path), downloader=downloader)
+
+    assert store.get_image('http://posters/a.jpg')[0] == store.get_image('http://posters/b.jpg')[0]
+    assert store.stats['bytes'] == 4
+
+
+def test_image_store_removes_interrupted_downloads_at_start(tmp_path):
+    objects_directory = tmp_path / 'objects'
+    objects_directory.mkdir()
+    (objects_directory / 'digest.123.tmp').write_bytes(b'partial')
+
+    store = ImageStore(str(tmp_path))
+
+    assert store.stats['bytes'] == 0
+    assert os.listdir(objects_directory) == []
+
+
+def test_image_store_evicts_least_recently_served_images(tmp_path):
+    downloader = StubDownloader({'http://posters/a.jpg': b'a' * 40, 'http://posters/b.jpg': b'b' * 40,
+                                 'http://posters/c.jpg': b'c' * 40})
+    store = ImageStore(str(tmp_path), max_bytes=100, downloader=downloader)
+
+    store.get_image('http://posters/a.jpg')
+    time.sleep(0.01)
+    store.get_image('http://posters/b.jpg')
+    time.sleep(0.01)
+    store.get_image('http://posters/a.jpg')
+    time.sleep(0.01)
+    store.get_image('http://posters/c.jpg')
+
+    assert store.stats['evictions'] == 1
+    assert store.stats['bytes'] == 80
+
+    # b was served least recently, so it was evicted and has to be downloaded again.
+    store.get_image('http://posters/b.jpg')
+    assert downloader.calls.count('http://posters/b.jpg') == 2
@@ -7,6 +7,7 @@ from movie_web_app.domain.model import Movie
 from movie_web_app.movies import services as movies_services
 from movie_web_app.authentication import services as auth_services
 from movie_web_app.movies.services import NonExistentMovieException
+from movie_web_app.utilities.lru_cache import LRUCache
 
 def test_can_add_user(in_memory_repo):
     new_username = 'jz'
@@ -184,3 +185,72 @@ def test_get_reviews_for_movie_without_reviews(in_memory_repo):
     reviews_as_dict = movies_services.get_reviews_for_movie(2, in_memory_repo)
     assert len(reviews_as_dict) == 0
 
+
+def test_search_movies(in_memory_repo):
+    movie_ranks, number_of_results = movies_services.search_movies('2014', 2, 2, in_memory_repo)
+    assert number_of_results == 99
+
+    movies_as_dict = movies_services.get_movies_by_rank(movie_ranks, in_memory_repo)
+    titles = [movie['title'] for movie in movies_as_dict]
+    assert titles == ['John Wick', 'Kingsman: The Secret Service']
+
+
+def test_search_movies_ranks_most_relevant_first(in_memory_repo):
+    movie_ranks, number_of_results = movies_services.search_movies('nolan', 0, 10, in_memory_repo)
+
+    # A match on the director counts for more than a match in the description.
+    directors = [movie['director'] for movie in movies_services.get_movies_by_rank(movie_ranks, in_memory_repo)]
+    assert directors[0] == 'Christopher Nolan'
+    assert directors == sorted(directors, key=lambda director: director != 'Christopher Nolan')
+
+
+def test_search_movies_without_results(in_memory_repo):
+    assert movies_services.search_movies('xyzzy', 0, 2, in_memory_repo) == ([], 0)
+
+
+def test_search_movies_reuses_results_for_later_pages(in_memory_repo, monkeypatch):
+    search_cache = LRUCache(sizeof=movies_services.search_result_size)
+    monkeypatch.setattr(movies_services, 'search_cache', search_cache)
+
+    searches = list()
+    search_movies = in_memory_repo.search_movies
+
+    def counting_search_movies(query, limit=None, offset=0):
+        searches.append(limit)
+        return search_movies(query, limit, offset)
+    monkeypatch.setattr(in_memory_repo, 'search_movies', counting_search_movies)
+
+    pages = [movies_services.search_movies('2014', cursor, 2, in_memory_repo)[0] for cursor in range(0, 20, 2)]
+    assert pages[1] == movies_services.search_movies('2014', 2, 2, in_memory_repo)[0]
+
+    # Word order and case don't matter.
+    movies_services.search_movies('Dark  KNIGHT', 0, 2, in_memory_repo)
+    movies_services.search_movies('knight dark', 0, 2, in_memory_repo)
+
+    # Ten pages took three searches, each fetching twice as many results as the one before.
+    assert searches == [4, 12, 28, 4]
+
+    stats = search_cache.stats
+    assert stats['entries'] == 2
+    assert stats['misses'] == 2
+    assert stats['hits'] == 11
+    assert stats['bytes'] > 0
+
+
+def test_filter_movies(in_memory_repo):
+    movie_ranks, facet_counts = movies_services.filter_movies({'release_year': 2016, 'genre': 'Horror'}, 2,
+                                                              in_memory_repo)
+
+    movies_as_dict = movies_services.get_movies_by_rank(movie_ranks, in_memory_repo)
+    assert all(movie['release_year'] == 2016 and 'Horror' in movie['genres'] for movie in movies_as_dict)
+    assert len(facet_counts['actor']) == 2
+
+
+def test_get_movies_sorted_by_rating(in_memory_repo):
+    movie_ranks, number_of_movies = movies_services.get_movies_sorted_by('rating', 0, 3, True, in_memory_repo)
+    assert number_of_movies == 1000
+
+    ratings = [movie['rating'] for movie in movies_services.get_movies_by_rank(movie_ranks, in_memory_repo)]
+    assert len(ratings) == 3
+    assert ratings == sorted(ratings, reverse=True)
+    assert ratings[0] == max(movie.rating for movie in in_memory_repo.all_movies())